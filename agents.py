@@ -1,10 +1,15 @@
-import openai
-from typing import Dict, Any, List, Optional
+import re
+import time
+import asyncio
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterator, Union, Tuple
 import json
 import config
 import utils
+from context_manager import count_tokens, count_message_tokens
 from semantic_storage import SemanticFileSystem
 from resource_manager import PredictiveResourceManager
+from router import CommandRouter, ROUTING_EXAMPLES, FILE_ACTION_EXAMPLES
 
 class BaseAgent:
     """Base class for all agents."""
@@ -12,10 +17,21 @@ class BaseAgent:
     def __init__(self, name: str, role: str):
         self.name = name
         self.role = role
-        self.client = openai.OpenAI(api_key=config.OPENAI_API_KEY)
+        self.last_ttft_ms = None
+        self.ttft_stats = {'count': 0, 'total_ms': 0.0}
     
-    def think(self, prompt: str, context: str = "") -> str:
-        """Use LLM to process request."""
+    @property
+    def client(self):
+        """Shared OpenAI client (created on first use)."""
+        return utils.get_client()
+    
+    @property
+    def async_client(self):
+        """Shared async OpenAI client (created on first use)."""
+        return utils.get_async_client()
+    
+    def _build_messages(self, prompt: str, context: str = "") -> List[Dict[str, str]]:
+        """Build the chat messages for a prompt."""
         messages = [
             {"role": "system", "content": self.role},
         ]
@@ -24,17 +40,123 @@ class BaseAgent:
             messages.append({"role": "system", "content": f"Context: {context}"})
         
         messages.append({"role": "user", "content": prompt})
+        return messages
+    
+    @staticmethod
+    def _request_tokens(messages: List[Dict[str, str]]) -> int:
+        """Tokens a completion request may use, for the rate limiter."""
+        return count_message_tokens(messages) + 500
+    
+    def think(self, prompt: str, context: str = "", stream: bool = False,
+              temperature: Optional[float] = None, cache: bool = False) -> Union[str, Iterator[str]]:
+        """Use LLM to process request.
+        
+        With `stream=True` this returns a generator of text deltas instead
+        of the complete response. With `cache=True` identical requests are
+        answered from the shared response cache. Requests go through the
+        shared rate limiter; API errors are raised once its retries are
+        exhausted.
+        """
+        if stream:
+            return self.think_stream(prompt, context)
         
-        try:
-            response = self.client.chat.completions.create(
+        messages = self._build_messages(prompt, context)
+        if temperature is None:
+            temperature = config.AGENT_TEMPERATURE
+        
+        if cache:
+            cached = utils.response_cache.get(config.MODEL_NAME, temperature, messages)
+            if cached is not None:
+                return cached
+        
+        response = utils.rate_limiter.call(
+            config.MODEL_NAME, self._request_tokens(messages),
+            lambda: self.client.chat.completions.create(
                 model=config.MODEL_NAME,
                 messages=messages,
-                temperature=config.AGENT_TEMPERATURE,
+                temperature=temperature,
+                max_tokens=500
+            )
+        )
+        utils.record_usage(config.MODEL_NAME, response)
+        content = response.choices[0].message.content
+        
+        if cache:
+            utils.response_cache.put(config.MODEL_NAME, temperature, messages, content)
+        return content
+    
+    async def think_async(self, prompt: str, context: str = "",
+                          temperature: Optional[float] = None, cache: bool = False) -> str:
+        """Use LLM to process request without blocking the event loop."""
+        messages = self._build_messages(prompt, context)
+        if temperature is None:
+            temperature = config.AGENT_TEMPERATURE
+        
+        if cache:
+            cached = utils.response_cache.get(config.MODEL_NAME, temperature, messages)
+            if cached is not None:
+                return cached
+        
+        response = await utils.rate_limiter.call_async(
+            config.MODEL_NAME, self._request_tokens(messages),
+            lambda: self.async_client.chat.completions.create(
+                model=config.MODEL_NAME,
+                messages=messages,
+                temperature=temperature,
                 max_tokens=500
             )
-            return response.choices[0].message.content
-        except Exception as e:
-            return f"Error in {self.name}: {str(e)}"
+        )
+        utils.record_usage(config.MODEL_NAME, response)
+        content = response.choices[0].message.content
+        
+        if cache:
+            utils.response_cache.put(config.MODEL_NAME, temperature, messages, content)
+        return content
+    
+    def classify(self, prompt: str) -> str:
+        """Run a deterministic classification prompt through the response cache."""
+        return self.think(prompt, temperature=config.SYSTEM_TEMPERATURE, cache=True)
+    
+    async def classify_async(self, prompt: str) -> str:
+        """Async counterpart of `classify`."""
+        return await self.think_async(prompt, temperature=config.SYSTEM_TEMPERATURE, cache=True)
+    
+    def think_stream(self, prompt: str, context: str = "") -> Iterator[str]:
+        """Use LLM to process request, yielding text as it is generated."""
+        messages = self._build_messages(prompt, context)
+        start = time.perf_counter()
+        first_token = True
+        parts = []
+        
+        # Rate limits and other request errors surface before the first chunk,
+        # so retries never repeat text that was already yielded
+        response = utils.rate_limiter.call(
+            config.MODEL_NAME, self._request_tokens(messages),
+            lambda: self.client.chat.completions.create(
+                model=config.MODEL_NAME,
+                messages=messages,
+                temperature=config.AGENT_TEMPERATURE,
+                max_tokens=500,
+                stream=True
+            )
+        )
+        for chunk in response:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if first_token:
+                first_token = False
+                self.last_ttft_ms = (time.perf_counter() - start) * 1000
+                self.ttft_stats['count'] += 1
+                self.ttft_stats['total_ms'] += self.last_ttft_ms
+            parts.append(delta)
+            yield delta
+        
+        # Streamed responses carry no usage, so count the tokens locally
+        utils.usage_tracker.record(config.MODEL_NAME, count_message_tokens(messages),
+                                   count_tokens("".join(parts)))
 
 class FileManagementAgent(BaseAgent):
     """Agent for file and document management."""
@@ -45,45 +167,98 @@ class FileManagementAgent(BaseAgent):
             role="You are a file management assistant. Help users create, find, and organize documents. Be concise and helpful."
         )
         self.fs = file_system
+        self.router = CommandRouter(FILE_ACTION_EXAMPLES)
     
-    def process_command(self, command: str, context: str = "") -> str:
+    def process_command(self, command: str, context: str = "", stream: bool = False) -> Union[str, Iterator[str]]:
         """Process file-related commands."""
         # Determine action
-        action_prompt = f"""
-        Analyze this command and respond with ONLY one of these actions:
-        - CREATE: if user wants to create a new document
-        - SEARCH: if user wants to find documents
-        - LIST: if user wants to see recent documents
-        - ORGANIZE: if user wants help organizing
-        
-        Command: {command}
-        
-        Action:"""
+        action_prompt = self._action_prompt(command)
         
-        action = self.think(action_prompt).strip().upper()
+        if config.LOCAL_ROUTING:
+            action = self.router.route(command, lambda: self.classify(action_prompt))
+        else:
+            action = self.classify(action_prompt).strip().upper()
         
         if "CREATE" in action:
+            if stream:
+                return self._create_document_stream(command, context)
             return self._create_document(command, context)
         elif "SEARCH" in action:
             return self._search_documents(command)
         elif "LIST" in action:
             return self._list_recent()
         else:
-            return self._provide_organization_advice(command)
+            return self._provide_organization_advice(command, stream)
     
-    def _create_document(self, command: str, context: str) -> str:
-        """Create a new document."""
-        content_prompt = f"""
+    async def process_command_async(self, command: str, context: str = "",
+                                    query_embedding: Optional[asyncio.Task] = None) -> str:
+        """Process file-related commands on the async pipeline.
+        
+        `query_embedding` is an optional task already embedding `command`;
+        it is shared by action routing and search.
+        """
+        action_prompt = self._action_prompt(command)
+        
+        if config.LOCAL_ROUTING:
+            action = await self.router.route_async(
+                command, lambda: self.classify_async(action_prompt), query_embedding
+            )
+        else:
+            action = (await self.classify_async(action_prompt)).strip().upper()
+        
+        if "CREATE" in action:
+            content = await self.think_async(self._content_prompt(command), context)
+            file_id = await asyncio.to_thread(self.fs.create_file, content, command)
+            return f"Created document {file_id} with content:\n\n{content[:200]}..."
+        elif "SEARCH" in action:
+            if query_embedding is not None:
+                # Warms the embedding cache used by the search below, which
+                # handles a failed embedding itself
+                await asyncio.gather(query_embedding, return_exceptions=True)
+            return await asyncio.to_thread(self._search_documents, command)
+        elif "LIST" in action:
+            return self._list_recent()
+        else:
+            return await self.think_async(f"Provide brief advice for: {command}")
+    
+    def _action_prompt(self, command: str) -> str:
+        """Prompt for classifying a file command."""
+        return f"""
+        Analyze this command and respond with ONLY one of these actions:
+        - CREATE: if user wants to create a new document
+        - SEARCH: if user wants to find documents
+        - LIST: if user wants to see recent documents
+        - ORGANIZE: if user wants help organizing
+        
+        Command: {command}
+        
+        Action:"""
+    
+    def _content_prompt(self, command: str) -> str:
+        """Prompt for generating document content."""
+        return f"""
         Based on this request, generate appropriate document content:
         Request: {command}
         
         Generate the content:"""
-        
-        content = self.think(content_prompt, context)
+    
+    def _create_document(self, command: str, context: str) -> str:
+        """Create a new document."""
+        content = self.think(self._content_prompt(command), context)
         file_id = self.fs.create_file(content, command)
         
         return f"Created document {file_id} with content:\n\n{content[:200]}..."
     
+    def _create_document_stream(self, command: str, context: str) -> Iterator[str]:
+        """Create a new document, streaming its content as it is generated."""
+        parts = []
+        for delta in self.think_stream(self._content_prompt(command), context):
+            parts.append(delta)
+            yield delta
+        
+        file_id = self.fs.create_file("".join(parts), command)
+        yield f"\n\nSaved as document {file_id}."
+    
     def _search_documents(self, command: str) -> str:
         """Search for documents."""
         results = self.fs.search(command)
@@ -93,7 +268,10 @@ class FileManagementAgent(BaseAgent):
         
         response = "Found these relevant documents:\n"
         for i, result in enumerate(results, 1):
-            response += f"\n{i}. {result['id']} (similarity: {result['similarity']:.2f})"
+            if 'similarity' in result:
+                response += f"\n{i}. {result['id']} (similarity: {result['similarity']:.2f})"
+            else:
+                response += f"\n{i}. {result['id']} (keyword match)"
             response += f"\n   Created: {result['created']}"
             response += f"\n   Preview: {result['content'][:100]}...\n"
         
@@ -114,9 +292,9 @@ class FileManagementAgent(BaseAgent):
         
         return response
     
-    def _provide_organization_advice(self, command: str) -> str:
+    def _provide_organization_advice(self, command: str, stream: bool = False) -> Union[str, Iterator[str]]:
         """Provide organization advice."""
-        return self.think(f"Provide brief advice for: {command}")
+        return self.think(f"Provide brief advice for: {command}", stream=stream)
 
 class SystemAnalysisAgent(BaseAgent):
     """Agent for system analysis and resource management."""
@@ -128,16 +306,78 @@ class SystemAnalysisAgent(BaseAgent):
         )
         self.rm = resource_manager
     
-    def process_command(self, command: str) -> str:
+    def process_command(self, command: str, stream: bool = False) -> Union[str, Iterator[str]]:
         """Process system analysis commands."""
-        self.rm.update()
+        if not self.rm.running:
+            self.rm.update()
         
         # Get current stats
         stats = self.rm.get_current_stats()
-        anomalies = self.rm.detect_anomalies()
+        anomalies = self.rm.detect_anomalies(stats)
+        history = self._usage_history(command)
         
         # Analyze with LLM
-        analysis_prompt = f"""
+        analysis_prompt = self._analysis_prompt(command, stats, anomalies, history)
+        
+        return self.think(analysis_prompt, stream=stream)
+    
+    async def process_command_async(self, command: str, sampling: Optional[asyncio.Task] = None) -> str:
+        """Process system analysis commands on the async pipeline.
+        
+        `sampling` is an optional task already running `rm.update()`.
+        """
+        if sampling is not None:
+            await sampling
+        elif not self.rm.running:
+            await asyncio.to_thread(self.rm.update)
+        
+        stats = await asyncio.to_thread(self.rm.get_current_stats)
+        anomalies = self.rm.detect_anomalies(stats)
+        history = await asyncio.to_thread(self._usage_history, command)
+        
+        return await self.think_async(self._analysis_prompt(command, stats, anomalies, history))
+    
+    HISTORY_UNITS = {'minute': 60, 'hour': 3600, 'day': 86400, 'week': 7 * 86400,
+                     'month': 30 * 86400, 'year': 365 * 86400}
+    
+    def _history_window(self, command: str) -> Optional[Tuple[str, float]]:
+        """Period a command asks about, e.g. "over the last day", as (label, seconds)."""
+        text = command.lower()
+        match = re.search(r'\b(?:last|past)\s+(\d+\s+)?(minute|hour|day|week|month|year)s?\b', text)
+        if match:
+            count = int(match.group(1) or 1)
+            label = f"last {count} {match.group(2)}s" if count > 1 else f"last {match.group(2)}"
+            return label, count * self.HISTORY_UNITS[match.group(2)]
+        if 'today' in text:
+            midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            return "today", (datetime.now() - midnight).total_seconds()
+        if 'yesterday' in text:
+            return "last 2 days", 2 * 86400
+        return None
+    
+    def _usage_history(self, command: str) -> Optional[str]:
+        """Summary of recorded usage over the period the command asks about."""
+        window = self._history_window(command)
+        if window is None:
+            return None
+        label, seconds = window
+        summary = self.rm.usage_history(seconds)
+        if summary is None:
+            return f"No usage recorded over the {label}"
+        lines = [f"Usage over the {label}:"]
+        for name, key, unit in (("CPU", 'cpu', '%'), ("Memory", 'memory', '%'), ("Disk I/O", 'disk_io', ' MB/s')):
+            lines.append(f"- {name}: avg {summary[key]['mean']:.1f}{unit}, peak {summary[key]['max']:.1f}{unit}")
+        
+        hourly = self.rm.patterns.get('hourly')
+        if hourly and seconds >= 86400:
+            busiest = max(hourly, key=lambda h: hourly[h]['cpu'])
+            lines.append(f"- Busiest hour of day: {busiest:02d}:00 (CPU avg {hourly[busiest]['cpu']:.1f}%)")
+        return "\n        ".join(lines)
+    
+    def _analysis_prompt(self, command: str, stats: Dict[str, Any], anomalies: List[str],
+                         history: Optional[str] = None) -> str:
+        """Prompt for analyzing the system state."""
+        return f"""
         Analyze this system state and user request:
         
         Request: {command}
@@ -145,16 +385,15 @@ class SystemAnalysisAgent(BaseAgent):
         System State:
         - CPU: {stats['cpu']['current']:.1f}% (predicted: {stats['cpu']['predicted_30s']:.1f}%)
         - Memory: {stats['memory']['current']:.1f}% (predicted: {stats['memory']['predicted_30s']:.1f}%)
-        - Disk: {stats['disk']['used_percent']:.1f}% used
+        - Disk: {stats['disk']['used_percent']:.1f}% used, I/O {stats['disk']['io_mb_s']:.1f} MB/s (predicted: {stats['disk']['predicted_io_30s']:.1f} MB/s)
         
         Top Processes:
         {json.dumps(stats['top_processes'], indent=2)}
         
         Anomalies: {', '.join(anomalies) if anomalies else 'None'}
+        {history or ''}
         
         Provide helpful analysis and recommendations:"""
-        
-        return self.think(analysis_prompt)
 
 class PersonalAssistant(BaseAgent):
     """Main personal assistant agent."""
@@ -181,21 +420,30 @@ class PersonalAssistant(BaseAgent):
             return self.memory[key]['value']
         return None
     
-    def process_general(self, command: str, context: str = "") -> str:
+    def process_general(self, command: str, context: str = "", stream: bool = False) -> Union[str, Iterator[str]]:
         """Process general commands and questions."""
         # Check if this is a memory command
         if "remember" in command.lower():
             return self._handle_memory(command)
         
         # General assistance
-        memory_context = f"User preferences: {json.dumps(self.memory)}" if self.memory else ""
-        full_context = f"{context}\n{memory_context}" if memory_context else context
+        return self.think(command, self._memory_context(context), stream=stream)
+    
+    async def process_general_async(self, command: str, context: str = "") -> str:
+        """Process general commands and questions on the async pipeline."""
+        if "remember" in command.lower():
+            return self._store_memory(await self.think_async(self._memory_prompt(command)))
         
-        return self.think(command, full_context)
+        return await self.think_async(command, self._memory_context(context))
     
-    def _handle_memory(self, command: str) -> str:
-        """Handle memory-related commands."""
-        memory_prompt = f"""
+    def _memory_context(self, context: str) -> str:
+        """Add remembered preferences to the context."""
+        memory_context = f"User preferences: {json.dumps(self.memory)}" if self.memory else ""
+        return f"{context}\n{memory_context}" if memory_context else context
+    
+    def _memory_prompt(self, command: str) -> str:
+        """Prompt for extracting something to remember."""
+        return f"""
         Extract what the user wants to remember from this command:
         "{command}"
         
@@ -204,9 +452,14 @@ class PersonalAssistant(BaseAgent):
         
         If you can't extract clear information, respond with {{"error": "unclear"}}.
         """
-        
-        response = self.think(memory_prompt)
-        
+    
+    def _handle_memory(self, command: str) -> str:
+        """Handle memory-related commands."""
+        response = self.think(self._memory_prompt(command))
+        return self._store_memory(response)
+    
+    def _store_memory(self, response: str) -> str:
+        """Remember the key/value extracted by the LLM."""
         try:
             data = json.loads(response)
             if "error" not in data:
@@ -220,35 +473,99 @@ class PersonalAssistant(BaseAgent):
 class AgentCoordinator:
     """Coordinates multiple agents."""
     
-    def __init__(self):
-        self.fs = SemanticFileSystem()
-        self.rm = PredictiveResourceManager()
+    def __init__(self, fs: Optional[SemanticFileSystem] = None,
+                 rm: Optional[PredictiveResourceManager] = None,
+                 assistant: Optional[PersonalAssistant] = None):
+        """Pass `fs` and `rm` to share one file system and resource manager
+        with other components. One coordinator can serve many conversations
+        (e.g. server sessions) by passing each its own `assistant` when
+        routing a command."""
+        self.fs = fs if fs is not None else SemanticFileSystem()
+        self.rm = rm if rm is not None else PredictiveResourceManager()
         
         self.file_agent = FileManagementAgent(self.fs)
         self.system_agent = SystemAnalysisAgent(self.rm)
-        self.assistant = PersonalAssistant()
+        self.assistant = assistant if assistant is not None else PersonalAssistant()
+        self.router = CommandRouter(ROUTING_EXAMPLES)
     
-    def route_command(self, command: str, context: str = "") -> tuple[str, str]:
-        """Route command to appropriate agent."""
-        routing_prompt = f"""
-        Classify this command into ONE category:
-        - FILE: for document/file operations
-        - SYSTEM: for resource/performance analysis  
-        - GENERAL: for general assistance
+    def route_command(self, command: str, context: str = "", stream: bool = False,
+                      assistant: Optional[PersonalAssistant] = None) -> tuple[str, Union[str, Iterator[str]]]:
+        """Route command to appropriate agent.
         
-        Command: {command}
-        
-        Category:"""
+        With `stream=True` the response may be a generator of text deltas
+        (for LLM-generated answers) or a plain string (for local results).
+        `assistant` handles general commands instead of the coordinator's own.
+        """
+        assistant = assistant if assistant is not None else self.assistant
+        routing_prompt = self._routing_prompt(command)
         
-        response = self.assistant.think(routing_prompt)
-        category = response.strip().upper()
+        if config.LOCAL_ROUTING:
+            category = self.router.route(command, lambda: assistant.classify(routing_prompt))
+        else:
+            category = assistant.classify(routing_prompt).strip().upper()
         
         if "FILE" in category:
-            agent_response = self.file_agent.process_command(command, context)
+            agent_response = self.file_agent.process_command(command, context, stream)
             return ("FileManager", agent_response)
         elif "SYSTEM" in category:
-            agent_response = self.system_agent.process_command(command)
+            agent_response = self.system_agent.process_command(command, stream)
             return ("SystemAnalyst", agent_response)
         else:
-            agent_response = self.assistant.process_general(command, context)
-            return ("Assistant", agent_response)
\ No newline at end of file
+            agent_response = assistant.process_general(command, context, stream)
+            return ("Assistant", agent_response)
+    
+    async def route_command_async(self, command: str, context: str = "",
+                                  assistant: Optional[PersonalAssistant] = None) -> tuple[str, str]:
+        """Route command to appropriate agent on the async pipeline.
+        
+        The command embedding (used for local routing and document search)
+        and, unless the background sampler is running, a resource sample
+        run concurrently with the routing decision. `assistant` is as for
+        `route_command`.
+        """
+        assistant = assistant if assistant is not None else self.assistant
+        routing_prompt = self._routing_prompt(command)
+        query_embedding = asyncio.create_task(utils.get_embedding_async(command))
+        sampling = None
+        if not self.rm.running:
+            sampling = asyncio.create_task(asyncio.to_thread(self.rm.update))
+        
+        if config.LOCAL_ROUTING:
+            category = await self.router.route_async(
+                command, lambda: assistant.classify_async(routing_prompt), query_embedding
+            )
+        else:
+            category = (await assistant.classify_async(routing_prompt)).strip().upper()
+        
+        try:
+            if "FILE" in category:
+                agent_response = await self.file_agent.process_command_async(command, context, query_embedding)
+                return ("FileManager", agent_response)
+            elif "SYSTEM" in category:
+                agent_response = await self.system_agent.process_command_async(command, sampling)
+                return ("SystemAnalyst", agent_response)
+            else:
+                agent_response = await assistant.process_general_async(command, context)
+                return ("Assistant", agent_response)
+        finally:
+            # Don't leave speculative work unawaited
+            await asyncio.gather(query_embedding, *([sampling] if sampling else []), return_exceptions=True)
+    
+    def _routing_prompt(self, command: str) -> str:
+        """Prompt for classifying a command."""
+        return f"""
+        Classify this command into ONE category:
+        - FILE: for document/file operations
+        - SYSTEM: for resource/performance analysis  
+        - GENERAL: for general assistance
+        
+        Command: {command}
+        
+        Category:"""
+    
+    def get_ttft_stats(self) -> Dict[str, Any]:
+        """Time-to-first-token statistics across all agents."""
+        agents = [self.file_agent, self.system_agent, self.assistant]
+        count = sum(a.ttft_stats['count'] for a in agents)
+        total = sum(a.ttft_stats['total_ms'] for a in agents)
+        return {'count': count, 'avg_ms': total / count if count else 0.0}
\ No newline at end of file
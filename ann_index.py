@@ -0,0 +1,275 @@
+import io
+import os
+import json
+import threading
+import numpy as np
+from typing import List, Tuple, Optional
+import config
+import utils
+from vector_store import VectorStore
+from storage import FileLock, atomic_write, atomic_write_json
+
+class IVFIndex:
+    """Inverted-file (IVF) approximate nearest-neighbour index.
+
+    Vectors are partitioned by k-means into coarse cells. A query scores the
+    cell centroids and only scans rows in the `nprobe` closest cells, trading
+    recall for latency. Each training writes a new version of the centroids
+    (.npy) and of the parallel int32 file with the cell of every store row,
+    then commits it by replacing a small manifest, so a crash never pairs
+    one training's centroids with another's assignments. Inserts only
+    assign the new rows.
+
+    With `background` (the default), training and retraining run on a
+    thread; until it finishes, searches use the previous index (or exact
+    search) and inserts are not held up.
+
+    Processes sharing the index take an advisory lock on `<path>.lock` to
+    append assignments or commit a training, and first pick up the cells
+    (or the new version) other processes wrote.
+    """
+
+    def __init__(self, path: str, store: VectorStore,
+                 nprobe: int = config.ANN_NPROBE,
+                 min_train: int = config.ANN_MIN_TRAIN,
+                 background: bool = True):
+        self.path = path
+        self.store = store
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.background = background
+        self.manifest_file = f"{path}.json"
+        self.lock = FileLock(f"{path}.lock")
+        self.version = 0
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.trained_rows = 0
+        self._order = None
+        self._bounds = None
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._training: Optional[threading.Thread] = None
+
+    def _files(self, version: int) -> Tuple[str, str]:
+        """Centroid and assignment files of one training."""
+        return f"{self.path}.{version}.centroids.npy", f"{self.path}.{version}.assign.i32"
+
+    @property
+    def is_trained(self) -> bool:
+        self._ensure_loaded()
+        return self.centroids is not None
+
+    @property
+    def training(self) -> bool:
+        return self._training is not None
+
+    def _ensure_loaded(self):
+        """Read the committed centroids and row assignments on first use."""
+        if self._loaded:
+            return
+        self._loaded = True
+        with self.lock, self._lock:
+            self._load()
+
+    def _read_manifest(self) -> Optional[dict]:
+        if not os.path.exists(self.manifest_file):
+            return None
+        with open(self.manifest_file, 'r') as f:
+            return json.load(f)
+
+    def _load(self):
+        """Switch to the committed version. Call with both locks held."""
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.trained_rows = 0
+        self._order = None
+        manifest = self._read_manifest()
+        if manifest is None:
+            return
+        self.version = manifest['version']
+        centroids_file, assign_file = self._files(self.version)
+        if not os.path.exists(centroids_file):
+            return
+        assignments = self._read_cells(assign_file, 0)
+        if len(assignments) < manifest['rows']:
+            return  # damaged; the index will be retrained
+
+        self.centroids = np.load(centroids_file)
+        self.assignments = assignments
+        self.trained_rows = manifest['rows']
+
+    @staticmethod
+    def _read_cells(assign_file: str, start: int) -> np.ndarray:
+        """Cells of rows `start` onwards, dropping a torn trailing one."""
+        if not os.path.exists(assign_file):
+            return np.zeros(0, dtype=np.int32)
+        with open(assign_file, 'rb') as f:
+            f.seek(start * 4)
+            data = f.read()
+        whole = len(data) // 4 * 4
+        if whole < len(data):
+            with open(assign_file, 'r+b') as f:
+                f.truncate(start * 4 + whole)
+        return np.frombuffer(data[:whole], dtype=np.int32)
+
+    @staticmethod
+    def _npy_bytes(array: np.ndarray) -> bytes:
+        buffer = io.BytesIO()
+        np.save(buffer, array)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """Nearest centroid (by dot product) for each row, in chunks."""
+        cells = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 65536):
+            chunk = np.asarray(vectors[start:start + 65536])
+            cells[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return cells
+
+    def _fit(self, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Cluster `matrix` into cells: (centroids, cell of every row)."""
+        from sklearn.cluster import MiniBatchKMeans
+
+        n = matrix.shape[0]
+        nlist = max(1, min(config.ANN_MAX_LISTS, int(np.sqrt(n))))
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(n, size=min(n, config.ANN_TRAIN_SAMPLE), replace=False))
+
+        kmeans = MiniBatchKMeans(n_clusters=nlist, random_state=0, n_init=3,
+                                 batch_size=min(len(sample), 4096))
+        kmeans.fit(np.asarray(matrix[sample]))
+        centroids = kmeans.cluster_centers_.astype(np.float32)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids = centroids / np.where(norms > 0, norms, 1)
+        return centroids, self._assign(matrix, centroids)
+
+    def _commit(self, centroids: np.ndarray, assignments: np.ndarray):
+        """Write a training as a new version and switch to it."""
+        with self.lock:
+            manifest = self._read_manifest()
+            committed = manifest['version'] if manifest else 0
+            version = max(self.version, committed) + 1
+            centroids_file, assign_file = self._files(version)
+            atomic_write(assign_file, assignments.tobytes())
+            atomic_write(centroids_file, self._npy_bytes(centroids))
+            atomic_write_json(self.manifest_file, {'version': version, 'rows': len(assignments)})
+
+            with self._lock:
+                old_versions = {self.version, committed}
+                self.version = version
+                self.centroids = centroids
+                self.assignments = assignments
+                self.trained_rows = len(assignments)
+                self._order = None
+            # (including the unversioned files written by older releases)
+            old_files = [f for v in old_versions for f in self._files(v)]
+            for old_file in old_files + [f"{self.path}.centroids.npy", f"{self.path}.assign.i32"]:
+                if os.path.exists(old_file):
+                    os.remove(old_file)
+
+    def train(self):
+        """Cluster the store into cells and assign every row (blocking)."""
+        self._ensure_loaded()
+        self._commit(*self._fit(self.store.matrix()))
+
+    def _train_in_background(self):
+        # Rows are append-only, so the mapping taken now stays valid while training
+        matrix = self.store.matrix()
+
+        def run():
+            try:
+                self._commit(*self._fit(matrix))
+            except Exception as e:
+                print(utils.format_error(f"ANN index training failed: {str(e)}"))
+            finally:
+                self._training = None
+
+        self._training = threading.Thread(target=run, name="ivf-train", daemon=True)
+        self._training.start()
+
+    def wait(self):
+        """Block until a background training has finished."""
+        thread = self._training
+        if thread is not None:
+            thread.join()
+
+    def update(self):
+        """Bring the index up to date with rows appended to the store.
+
+        Trains once the store reaches `min_train` rows and retrains when it
+        has grown by ANN_RETRAIN_FACTOR since the last training, otherwise
+        just assigns the new rows to their nearest cell.
+        """
+        self._ensure_loaded()
+        rows = self.store.rows
+        if rows <= len(self.assignments):
+            return
+
+        with self.lock, self._lock:
+            self._catch_up()
+            if self.centroids is None:
+                due = len(self.store) >= self.min_train
+            else:
+                due = rows > self.trained_rows * config.ANN_RETRAIN_FACTOR
+            if due and self._training is None:
+                if not self.background:
+                    self.train()
+                    return
+                self._train_in_background()
+            if self.centroids is None:
+                return
+
+            done = len(self.assignments)
+            if rows > done:
+                cells = self._assign(self.store.matrix()[done:rows], self.centroids)
+                with open(self._files(self.version)[1], 'ab') as f:
+                    f.write(cells.tobytes())
+                self.assignments = np.concatenate([self.assignments, cells])
+                self._order = None
+
+    def _catch_up(self):
+        """Pick up a training committed, or rows assigned, by another process.
+
+        Call with both locks held.
+        """
+        manifest = self._read_manifest()
+        if manifest is not None and manifest['version'] != self.version:
+            self._load()
+        elif self.centroids is not None:
+            cells = self._read_cells(self._files(self.version)[1], len(self.assignments))
+            if len(cells):
+                self.assignments = np.concatenate([self.assignments, cells])
+                self._order = None
+
+    def _lists(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows grouped by cell: (row order, per-cell boundaries)."""
+        if self._order is None:
+            self._order = np.argsort(self.assignments, kind='stable')
+            cells = np.arange(len(self.centroids) + 1)
+            self._bounds = np.searchsorted(self.assignments[self._order], cells)
+        return self._order, self._bounds
+
+    def search(self, query: List[float], limit: int = 5,
+               nprobe: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Approximate top-k; falls back to exact search when untrained."""
+        self.update()
+        with self._lock:
+            centroids = self.centroids
+            if centroids is not None:
+                order, bounds = self._lists()
+        if centroids is None or query is None or len(query) != self.store.dim:
+            return self.store.search(query, limit)
+
+        nprobe = min(nprobe or self.nprobe, len(centroids))
+        q = np.asarray(query, dtype=np.float32)
+        cell_scores = centroids @ q
+        if nprobe < len(cell_scores):
+            probe = np.argpartition(-cell_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(len(cell_scores))
+
+        candidates = np.concatenate([order[bounds[c]:bounds[c + 1]] for c in probe])
+        # Other processes may have assigned rows this store hasn't loaded yet
+        candidates = candidates[candidates < self.store.rows]
+        return self.store.search(query, limit, rows=candidates)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for LLM OS components
+Run `python benchmark.py <name> --help` for the options of each benchmark
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """Clustered random vectors, roughly shaped like text embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    labels = rng.integers(0, clusters, size=n)
+    return (centers[labels] + rng.normal(scale=0.6, size=(n, dim))).astype(np.float32)
+
+def bench_ann(args):
+    """Recall@k and latency of the IVF index against brute force."""
+    from vector_store import VectorStore
+    from ann_index import IVFIndex
+
+    print(f"Building store with {args.n} vectors of dimension {args.dim}...")
+    vectors = synthetic_vectors(args.n, args.dim)
+    queries = synthetic_vectors(args.queries, args.dim, seed=1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(os.path.join(tmp, "vectors"))
+        store.add_many((f"doc_{i}", v) for i, v in enumerate(vectors))
+
+        start = time.perf_counter()
+        index = IVFIndex(os.path.join(tmp, "ivf"), store, min_train=0)
+        index.train()
+        print(f"Trained {len(index.centroids)} cells in {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        exact = [set(i for i, _ in store.search(q, args.k)) for q in queries]
+        exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        print(f"\n{'nprobe':>8} {'recall@' + str(args.k):>10} {'ms/query':>10} {'speedup':>8}")
+        print(f"{'exact':>8} {1.0:>10.3f} {exact_ms:>10.2f} {1.0:>8.1f}")
+
+        for nprobe in args.nprobe:
+            start = time.perf_counter()
+            found = [set(i for i, _ in index.search(q, args.k, nprobe)) for q in queries]
+            ms = (time.perf_counter() - start) * 1000 / len(queries)
+            recall = np.mean([len(f & e) / len(e) for f, e in zip(found, exact)])
+            print(f"{nprobe:>8} {recall:>10.3f} {ms:>10.2f} {exact_ms / ms:>8.1f}")
+
+def bench_quantize(args):
+    """Memory and recall@k of the vector representations against float64."""
+    from vector_store import VectorStore
+
+    print(f"Generating {args.n} vectors of dimension {args.dim}...")
+    vectors = synthetic_vectors(args.n, args.dim)
+    queries = synthetic_vectors(args.queries, args.dim, seed=1)
+    base = vectors.astype(np.float64)
+    base /= np.linalg.norm(base, axis=1, keepdims=True)
+
+    start = time.perf_counter()
+    truth = [set(np.argsort(-(base @ q))[:args.k]) for q in queries.astype(np.float64)]
+    base_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    # Python lists of floats: one boxed float per element plus the list itself
+    list_bytes = args.n * (sys.getsizeof(list(vectors[0])) + args.dim * sys.getsizeof(0.0))
+    print(f"\n{'representation':>16} {'MB':>9} {'vs float64':>10} {'recall@' + str(args.k):>10} {'ms/query':>9}")
+    print(f"{'python lists':>16} {list_bytes / 2**20:>9.1f} {list_bytes / base.nbytes:>10.2f}")
+    print(f"{'float64':>16} {base.nbytes / 2**20:>9.1f} {1.0:>10.2f} {1.0:>10.3f} {base_ms:>9.2f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in ("float32", "float16", "int8"):
+            path = os.path.join(tmp, dtype)
+            VectorStore(path, dtype=dtype, rerank=False).add_many(
+                (str(i), v) for i, v in enumerate(vectors))
+            for rerank in ((False,) if dtype == "float32" else (False, True)):
+                store = VectorStore(path, dtype=dtype, rerank=rerank, rerank_factor=args.rerank_factor)
+                store.search(queries[0], args.k)  # load and map the files
+                start = time.perf_counter()
+                found = [set(int(i) for i, _ in store.search(q, args.k)) for q in queries]
+                ms = (time.perf_counter() - start) * 1000 / len(queries)
+                recall = np.mean([len(f & t) / args.k for f, t in zip(found, truth)])
+                name = dtype + (" + rerank" if rerank else "")
+                print(f"{name:>16} {store.scan_bytes / 2**20:>9.1f} {store.scan_bytes / base.nbytes:>10.2f} "
+                      f"{recall:>10.3f} {ms:>9.2f}")
+    print("\nMB is the vector data a search scans; re-ranking also reads "
+          f"{args.rerank_factor * args.k} float32 rows per query.")
+
+STARTUP_SCRIPT = """
+import io, sys, json, time, contextlib
+start = time.perf_counter()
+import config
+config.STORAGE_PATH = {storage!r}
+config.EMBEDDINGS_CACHE = {storage!r} + "/embeddings_cache.db"
+config.RESPONSE_CACHE_PATH = {storage!r} + "/response_cache.db"
+config.METRICS_PATH = {storage!r} + "/metrics"
+config.CONVERSATION_JOURNAL = {storage!r} + "/conversation.journal"
+config.FAST_START = {fast_start!r}
+import llm_os
+imported = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    os_instance = llm_os.LLMOS()
+ready = time.perf_counter()
+os_instance.coordinator.fs.get_recent_files()
+first_use = time.perf_counter()
+print(json.dumps({{"import": imported - start, "init": ready - imported,
+                  "first_store_access": first_use - ready, "total": ready - start}}))
+"""
+
+def bench_startup(args):
+    """Cold start time of LLMOS, measured in fresh interpreters."""
+    with tempfile.TemporaryDirectory() as storage:
+        if args.docs:
+            from metadata_store import MetadataStore
+            store = MetadataStore(os.path.join(storage, "metadata.json"),
+                                  os.path.join(storage, "metadata.journal"))
+            store.create_many([{"id": f"file_{i}", "content": "lorem ipsum " * 100,
+                                "created": "2024-01-01 00:00:00", "access_count": 0}
+                               for i in range(args.docs)])
+            store.close()
+            print(f"Created a store with {args.docs} documents")
+
+        env = dict(os.environ, OPENAI_API_KEY=os.getenv("OPENAI_API_KEY") or "sk-benchmark")
+        here = os.path.dirname(os.path.abspath(__file__))
+        print(f"\n{'mode':>10} {'import':>8} {'init':>8} {'ready':>8} {'1st store':>10}  (seconds, median of {args.runs})")
+        for fast_start in (False, True):
+            runs = []
+            for _ in range(args.runs):
+                script = STARTUP_SCRIPT.format(storage=storage, fast_start=fast_start)
+                out = subprocess.run([sys.executable, "-c", script], cwd=here, env=env,
+                                     capture_output=True, text=True)
+                lines = out.stdout.strip().splitlines()
+                if out.returncode != 0 or not lines:
+                    print(f"{'fast' if fast_start else 'blocking':>10} failed (no API access?)")
+                    break
+                runs.append(json.loads(lines[-1]))
+            if runs:
+                med = {k: sorted(r[k] for r in runs)[len(runs) // 2] for k in runs[0]}
+                print(f"{'fast' if fast_start else 'blocking':>10} {med['import']:>8.3f} {med['init']:>8.3f} "
+                      f"{med['total']:>8.3f} {med['first_store_access']:>10.3f}")
+
+def load_trace(path: str) -> dict:
+    """Read a CSV trace with columns time,cpu,memory,disk_read,disk_write."""
+    import csv
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    return {k: np.array([float(r[k]) for r in rows]) for k in rows[0]}
+
+def synthetic_trace(n: int, interval: float = 5.0, seed: int = 0) -> dict:
+    """Daily-cycle CPU and memory with noise and bursts, plus disk counters."""
+    rng = np.random.default_rng(seed)
+    t = 1.7e9 + np.arange(n) * interval
+    day = np.sin(2 * np.pi * (t % 86400) / 86400)
+    cpu = np.clip(30 + 15 * day + rng.normal(0, 5, n) + 40 * (rng.random(n) < 0.01), 0, 100)
+    memory = np.clip(55 + 10 * day + np.cumsum(rng.normal(0, 0.2, n)), 0, 100)
+    io = rng.exponential(2 * 1024 * 1024, size=(2, n)) * interval
+    return {"time": t, "cpu": cpu, "memory": memory,
+            "disk_read": np.cumsum(io[0]), "disk_write": np.cumsum(io[1])}
+
+def record_trace(path: str, seconds: float, interval: float):
+    """Record a trace of this machine to CSV."""
+    import csv
+    import psutil
+    psutil.cpu_percent(interval=None)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["time", "cpu", "memory", "disk_read", "disk_write"])
+        end = time.time() + seconds
+        while time.time() < end:
+            time.sleep(interval)
+            io = psutil.disk_io_counters()
+            writer.writerow([time.time(), psutil.cpu_percent(interval=None),
+                             psutil.virtual_memory().percent, io.read_bytes, io.write_bytes])
+    print(f"Recorded {path}")
+
+def bench_forecast(args):
+    """Replay a resource trace through the streaming estimators."""
+    from resource_manager import PredictiveResourceManager
+
+    if args.record:
+        record_trace(args.record, args.seconds, args.interval)
+        return
+    trace = load_trace(args.trace) if args.trace else synthetic_trace(args.n)
+    n = len(trace["time"])
+    print(f"Replaying {n} samples ({'recorded' if args.trace else 'synthetic'} trace)")
+
+    def lstsq_predict(times, values, horizon):
+        # The previous approach: refit on the last 10 samples for every prediction
+        x = times[-10:] - times[-1]
+        A = np.vstack([x, np.ones(len(x))]).T
+        m, c = np.linalg.lstsq(A, values[-10:], rcond=None)[0]
+        return max(0, min(100, m * horizon + c))
+
+    horizon_steps = max(1, int(round(args.horizon / np.median(np.diff(trace["time"])))))
+    rm = PredictiveResourceManager()
+    streaming, refit = [], []
+    stream_time = refit_time = 0.0
+    anomalies = 0
+    for i in range(n):
+        sample = {k: trace[k][i] for k in ("cpu", "memory", "disk_read", "disk_write")}
+
+        start = time.perf_counter()
+        rm.observe(trace["time"][i], sample)
+        f = rm.forecasters["cpu"]
+        prediction = f.forecast(args.horizon) if f.count >= 5 else 0.0
+        anomalies += abs(rm.zscores["cpu"]) > 3 and len(rm.baselines["cpu"]) >= 10
+        stream_time += time.perf_counter() - start
+        streaming.append(prediction)
+
+        start = time.perf_counter()
+        refit.append(lstsq_predict(trace["time"][:i + 1], trace["cpu"][:i + 1], args.horizon) if i >= 4 else 0.0)
+        refit_time += time.perf_counter() - start
+
+    actual = trace["cpu"][horizon_steps:]
+    valid = slice(5, n - horizon_steps)
+    print(f"\n{'method':>10} {'us/sample':>10} {'CPU MAE @' + str(args.horizon) + 's':>14}")
+    for name, preds, spent in (("lstsq", refit, refit_time), ("holt", streaming, stream_time)):
+        mae = np.mean(np.abs(np.array(preds[:n - horizon_steps])[valid] - actual[valid]))
+        print(f"{name:>10} {spent / n * 1e6:>10.1f} {mae:>14.2f}")
+    print(f"\nCPU z-score anomalies flagged: {anomalies}")
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM OS benchmarks")
+    sub = parser.add_subparsers(dest="benchmark")
+
+    ann = sub.add_parser("ann", help="IVF recall@k and latency vs brute force")
+    ann.add_argument("--n", type=int, default=100000, help="number of vectors")
+    ann.add_argument("--dim", type=int, default=256, help="vector dimension")
+    ann.add_argument("--queries", type=int, default=200, help="number of queries")
+    ann.add_argument("--k", type=int, default=10, help="neighbours per query")
+    ann.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    ann.set_defaults(func=bench_ann)
+
+    quantize = sub.add_parser("quantize", help="memory and recall of float16/int8 vectors vs float64")
+    quantize.add_argument("--n", type=int, default=50000, help="number of vectors")
+    quantize.add_argument("--dim", type=int, default=768, help="vector dimension")
+    quantize.add_argument("--queries", type=int, default=100, help="number of queries")
+    quantize.add_argument("--k", type=int, default=10, help="neighbours per query")
+    quantize.add_argument("--rerank-factor", type=int, default=4, help="candidates re-ranked per result")
+    quantize.set_defaults(func=bench_quantize)
+
+    startup = sub.add_parser("startup", help="LLMOS cold start time")
+    startup.add_argument("--runs", type=int, default=5, help="interpreter launches per mode")
+    startup.add_argument("--docs", type=int, default=0, help="documents in the metadata store")
+    startup.set_defaults(func=bench_startup)
+
+    forecast = sub.add_parser("forecast", help="replay a resource trace through the forecasters")
+    forecast.add_argument("--trace", help="CSV trace (time,cpu,memory,disk_read,disk_write)")
+    forecast.add_argument("--n", type=int, default=20000, help="samples in the synthetic trace")
+    forecast.add_argument("--horizon", type=int, default=30, help="forecast horizon in seconds")
+    forecast.add_argument("--record", help="record a trace of this machine to this CSV file instead")
+    forecast.add_argument("--seconds", type=float, default=600, help="recording length")
+    forecast.add_argument("--interval", type=float, default=5, help="recording interval")
+    forecast.set_defaults(func=bench_forecast)
+
+    args = parser.parse_args()
+    if not hasattr(args, "func"):
+        parser.print_help()
+        sys.exit(1)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,7 @@ except ImportError:
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 MODEL_NAME = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')  # Can be overridden
 EMBEDDING_MODEL = os.getenv('OPENAI_EMBEDDING_MODEL', 'text-embedding-ada-002')
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')  # e.g. a local stub server for load tests
 
 # Alternative models you can use:
 # MODEL_NAME = "gpt-3.5-turbo-0125"  # Latest GPT-3.5
@@ -21,20 +22,127 @@ EMBEDDING_MODEL = os.getenv('OPENAI_EMBEDDING_MODEL', 'text-embedding-ada-002')
 # MODEL_NAME = "gpt-4-turbo-preview"  # Most capable
 
 # System settings
-MAX_CONTEXT_LENGTH = 4000
-MAX_CONVERSATION_HISTORY = 10
+MAX_CONTEXT_LENGTH = 4000  # token budget for the conversation context
+MAX_CONVERSATION_HISTORY = 10  # turns kept verbatim; older ones are summarized
+CONTEXT_SUMMARY_TOKENS = 400  # part of the budget for summaries of older turns
+SHOW_TOKEN_USAGE = True  # print prompt tokens and cost after each command
+
+# API prices in USD per million tokens (input, output); versions match by prefix
+MODEL_PRICES = {
+    'gpt-3.5-turbo': (0.50, 1.50),
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4-turbo': (10.00, 30.00),
+    'text-embedding-ada-002': (0.10, 0.0),
+    'text-embedding-3-small': (0.02, 0.0),
+}
+FAST_START = True  # check the API connection in the background at startup
+
+# Client-side rate limits as (requests, tokens) per minute; match your account's tier
+RATE_LIMITS = {
+    'default': (3500, 90000),
+    'text-embedding-ada-002': (3000, 1000000),
+    'text-embedding-3-small': (3000, 1000000),
+}
+API_MAX_RETRIES = 5  # retries of rate-limited, timed out or failed (5xx) requests
+API_RETRY_BASE_DELAY = 0.5  # seconds; doubled on every retry, with jitter
+API_RETRY_MAX_DELAY = 30.0  # seconds
 
 # Storage paths - use absolute paths to avoid issues
 BASE_DIR = Path(__file__).parent.absolute()
-STORAGE_PATH = os.path.join(BASE_DIR, "llm_os_storage")
-EMBEDDINGS_CACHE = os.path.join(STORAGE_PATH, "embeddings_cache.json")
+STORAGE_PATH = os.getenv('LLM_OS_STORAGE', os.path.join(BASE_DIR, "llm_os_storage"))
+EMBEDDINGS_CACHE = os.path.join(STORAGE_PATH, "embeddings_cache.db")
+EMBEDDINGS_CACHE_SIZE = 2048  # in-memory LRU entries
+
+# Response cache for deterministic (classification) prompts
+RESPONSE_CACHE_SIZE = 512  # in-memory entries
+RESPONSE_CACHE_TTL = 24 * 3600  # seconds
+RESPONSE_CACHE_DISK_SIZE = 10000  # rows kept in the on-disk tier
+RESPONSE_CACHE_PATH = os.path.join(STORAGE_PATH, "response_cache.db")  # None = memory only
+
+# When journaled writes (file metadata, conversation) are fsynced: 'sync' after
+# every write, 'debounced' in the background FLUSH_DELAY seconds after a burst of
+# writes, 'shutdown' only on close. Writes always reach the OS immediately.
+DURABILITY = os.getenv('LLM_OS_DURABILITY', 'debounced')
+FLUSH_DELAY = 1.0  # seconds
+
+# Conversation journal
+CONVERSATION_JOURNAL = os.path.join(STORAGE_PATH, "conversation.journal")
+CONVERSATION_SYNC_INTERVAL = 1.0  # seconds before appended turns are fsynced (debounced)
+CONVERSATION_RESUME_TURNS = 20  # turns read back into the context on startup
+CONVERSATION_JOURNAL_MAX_BYTES = 5 * 1024 * 1024  # compact and archive beyond this
+CONVERSATION_ARCHIVES = 5  # gzipped old journals kept
+
+# Bulk ingestion
+INGEST_BATCH_SIZE = 100  # texts per embeddings request
+INGEST_WORKERS = 4  # concurrent embeddings requests
+
+# Server mode (python server.py)
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8765
+SERVER_MAX_CONCURRENT = 16  # commands processed at the same time
+SERVER_MAX_QUEUE = 64  # commands waiting for a slot before requests get 503
+SERVER_MAX_SESSIONS = 1000  # least recently used sessions are dropped beyond this
+SERVER_SESSION_TTL = 3600  # seconds of inactivity before a session is dropped
+
+# Headless batch mode (python llm_os.py --batch FILE)
+BATCH_WORKERS = 4  # commands processed in parallel
+
+# Embedding vectors: searches score an 'int8' (scaled per vector) or 'float16'
+# copy, or the 'float32' rows themselves; quantized results can be re-ranked
+# exactly from the float32 rows. int8 scans a quarter of the bytes at float32
+# speed; float16 halves them but converting it is slow on most CPUs.
+# Compare with `python benchmark.py quantize`.
+VECTOR_DTYPE = 'int8'
+VECTOR_RERANK = True
+VECTOR_RERANK_FACTOR = 4  # candidates re-ranked per requested result
+
+# Approximate nearest-neighbour (IVF) search
+ANN_MIN_TRAIN = 5000  # exact search below this many documents
+ANN_NPROBE = 8  # cells scanned per query: higher = better recall, slower
+ANN_MAX_LISTS = 4096  # upper bound on k-means cells (default is sqrt(n))
+ANN_TRAIN_SAMPLE = 50000  # vectors sampled for k-means training
+ANN_RETRAIN_FACTOR = 4  # retrain when the store grows by this factor
+
+# Search: 'hybrid' (lexical + semantic, fused), 'semantic' or 'lexical' (no API call)
+SEARCH_MODE = 'hybrid'
+LEXICAL_SHORTCUT = True  # in hybrid mode, skip the embedding when the top keyword hit has every query term
+RRF_K = 60  # reciprocal rank fusion constant
+BM25_K1 = 1.2
+BM25_B = 0.75
+BM25_TAG_WEIGHT = 2  # tags count this many times as much as a word in the content
+
+# File metadata: 'json' (snapshot + journal, held in memory) or 'sqlite'
+# (on disk, indexed, full-text search); metadata.json is migrated on first use
+METADATA_BACKEND = 'json'
+METADATA_DB = os.path.join(STORAGE_PATH, "metadata.db")
+
+# Metadata journal - compact into metadata.json after this many entries
+METADATA_CHECKPOINT_INTERVAL = 1000
 
 # Agent settings
 AGENT_TEMPERATURE = 0.7
 SYSTEM_TEMPERATURE = 0.3
+STREAM_RESPONSES = True  # print agent responses token by token
+ASYNC_PIPELINE = False  # overlap routing, embedding and sampling (no streaming)
+
+# Local command routing (embedding nearest-centroid, LLM fallback)
+LOCAL_ROUTING = True
+ROUTER_MIN_MARGIN = 0.02  # below this score gap between labels, ask the LLM
 
 # Resource monitoring
-RESOURCE_CHECK_INTERVAL = 5  # seconds
+RESOURCE_CHECK_INTERVAL = 5  # seconds between background samples
+RESOURCE_HISTORY_SIZE = 720  # samples kept in memory (1 hour at 5s)
+SNAPSHOT_TTL = 2  # seconds a system snapshot is reused across callers
+TOP_PROCESSES = 5  # processes reported by the system agent
+FORECAST_ALPHA = 0.3  # Holt level smoothing
+FORECAST_BETA = 0.1  # Holt trend smoothing
+ANOMALY_WINDOW = 120  # samples in the rolling baseline (10 minutes at 5s)
+ANOMALY_ZSCORE = 3.0  # deviation from the baseline reported as an anomaly
+METRICS_PATH = os.path.join(STORAGE_PATH, "metrics")
+# (seconds per bucket, buckets kept): 5s for a day, 1m for a week, 1h for a year
+METRICS_RESOLUTIONS = [(5, 17280), (60, 10080), (3600, 8760)]
+METRICS_MAX_POINTS = 2000  # coarser resolutions are used for longer ranges
 PREDICTION_WINDOW = 60  # seconds
 
 # Colors for terminal
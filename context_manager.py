@@ -0,0 +1,156 @@
+import re
+import threading
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+import config
+
+_encoder = None
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in `text`.
+
+    Uses tiktoken when it is installed, otherwise the usual estimate of
+    about four characters per token.
+    """
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            try:
+                _encoder = tiktoken.encoding_for_model(config.MODEL_NAME)
+            except KeyError:
+                _encoder = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text))
+    return (len(text) + 3) // 4
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """Approximate prompt tokens of a chat request, including per-message overhead."""
+    return sum(count_tokens(m['content']) + 4 for m in messages) + 2
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` down to about `max_tokens` tokens."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    # Start from the character estimate and shrink until it fits
+    cut = max_tokens * 4
+    while cut > 0 and count_tokens(text[:cut]) > max_tokens - 1:
+        cut = int(cut * 0.9)
+    return text[:cut].rstrip() + "..."
+
+class UsageTracker:
+    """Running totals of API token usage and cost."""
+
+    def __init__(self, prices: Dict[str, Tuple[float, float]] = config.MODEL_PRICES):
+        self.prices = prices
+        self.totals = {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cost': 0.0}
+        self._lock = threading.Lock()
+
+    def price(self, model: str) -> Tuple[float, float]:
+        """(input, output) USD per million tokens, matching model versions by prefix."""
+        matches = [name for name in self.prices if model.startswith(name)]
+        if not matches:
+            return (0.0, 0.0)
+        return self.prices[max(matches, key=len)]
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int = 0) -> float:
+        """Add one request and return its cost."""
+        input_price, output_price = self.price(model)
+        cost = (prompt_tokens * input_price + completion_tokens * output_price) / 1e6
+        with self._lock:
+            self.totals['requests'] += 1
+            self.totals['prompt_tokens'] += prompt_tokens
+            self.totals['completion_tokens'] += completion_tokens
+            self.totals['cost'] += cost
+        return cost
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.totals)
+
+    def since(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """Usage added after `snapshot` was taken."""
+        current = self.snapshot()
+        return {k: current[k] - snapshot[k] for k in current}
+
+class ContextManager:
+    """Conversation context kept within a token budget.
+
+    Each turn's rendered line and token count are computed once, when the
+    turn is added, so building the context is a join. When the turns exceed
+    `max_turns` or the budget, the oldest are evicted and replaced by a
+    one-line extractive summary; summaries are themselves capped at
+    `summary_tokens`, dropping the oldest first.
+    """
+
+    RESERVED_TOKENS = 50  # time and session lines appended by the caller
+
+    def __init__(self, max_tokens: int = config.MAX_CONTEXT_LENGTH,
+                 max_turns: int = config.MAX_CONVERSATION_HISTORY,
+                 summary_tokens: int = config.CONTEXT_SUMMARY_TOKENS):
+        self.max_tokens = max_tokens
+        self.max_turns = max_turns
+        self.summary_tokens = summary_tokens
+        self.entries = deque()  # (entry, line, tokens)
+        self.summary = deque()  # (line, tokens)
+        self.entry_tokens = 0
+        self.summary_total = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def tokens(self) -> int:
+        """Tokens of the conversation part of the context."""
+        return self.entry_tokens + self.summary_total
+
+    def add(self, role: str, content: str, **fields):
+        """Append a turn, evicting old turns if the budget is exceeded."""
+        entry = {'role': role, 'content': content, **fields}
+        # A single turn may use at most half of the budget
+        line = f"{role}: {truncate_tokens(content, self.max_tokens // 2)}"
+        tokens = count_tokens(line) + 1
+        self.entries.append((entry, line, tokens))
+        self.entry_tokens += tokens
+        self._enforce()
+
+    def _enforce(self):
+        budget = self.max_tokens - self.RESERVED_TOKENS
+        while self.entries and (len(self.entries) > self.max_turns or self.tokens > budget):
+            entry, _, tokens = self.entries.popleft()
+            self.entry_tokens -= tokens
+            self.evicted += 1
+            self._summarize(entry)
+            if len(self.entries) <= 1 and self.tokens > budget:
+                # Only the newest turn is left; shed summaries instead
+                while self.summary and self.tokens > budget:
+                    self.summary_total -= self.summary.popleft()[1]
+                break
+
+    def _summarize(self, entry: Dict[str, Any]):
+        """Keep the first sentence of an evicted turn."""
+        text = " ".join(entry['content'].split())
+        first = re.split(r'(?<=[.!?])\s', text, maxsplit=1)[0]
+        line = f"- {entry['role']}: {truncate_tokens(first, 40)}"
+        tokens = count_tokens(line) + 1
+        self.summary.append((line, tokens))
+        self.summary_total += tokens
+        while self.summary and self.summary_total > self.summary_tokens:
+            self.summary_total -= self.summary.popleft()[1]
+
+    def build(self, extra: Optional[List[str]] = None) -> str:
+        """Render the context: summary, recent turns, then `extra` lines."""
+        parts = []
+        if self.summary:
+            parts.append("Earlier conversation (summary):\n" + "\n".join(line for line, _ in self.summary))
+        if self.entries:
+            parts.append("Recent conversation:\n" + "\n".join(line for _, line, _ in self.entries))
+        parts.extend(extra or [])
+        return "\n\n".join(parts)
+
+    def history(self) -> List[Dict[str, Any]]:
+        """The turns currently kept verbatim."""
+        return [entry for entry, _, _ in self.entries]
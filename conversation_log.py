@@ -0,0 +1,81 @@
+import os
+import gzip
+import shutil
+import threading
+from typing import Dict, Any, List
+import config
+import utils
+from journal import Journal
+
+class ConversationLog:
+    """Conversation turns persisted to an append-only journal as they happen.
+
+    Appends are flushed immediately and fsynced per `config.DURABILITY`; in
+    the default debounced mode a power loss costs at most the last
+    `sync_interval` seconds, and a process crash nothing. Resuming reads
+    only the tail of the file. Once the journal grows past `max_bytes` it
+    is compacted to its recent turns and the old file is kept as a gzip
+    archive, up to `archives` of them.
+    """
+
+    def __init__(self, path: str = config.CONVERSATION_JOURNAL,
+                 sync_interval: float = config.CONVERSATION_SYNC_INTERVAL,
+                 max_bytes: int = config.CONVERSATION_JOURNAL_MAX_BYTES,
+                 archives: int = config.CONVERSATION_ARCHIVES):
+        self.journal = Journal(path, flush_delay=sync_interval)
+        self.max_bytes = max_bytes
+        self.archives = archives
+        self._lock = threading.Lock()
+        self._migrated = False
+
+    @property
+    def path(self) -> str:
+        return self.journal.path
+
+    def append(self, entry: Dict[str, Any]):
+        """Record one turn, rotating the journal when it gets too large."""
+        with self._lock:
+            self._migrate()
+            self.journal.append(entry)
+            if self.journal.size > self.max_bytes:
+                self.rotate()
+
+    def recent(self, n: int = config.CONVERSATION_RESUME_TURNS) -> List[Dict[str, Any]]:
+        """The last `n` turns, oldest first."""
+        with self._lock:
+            self._migrate()
+            return self.journal.tail(n)
+
+    def rotate(self):
+        """Archive the journal and keep only the turns needed to resume."""
+        archive = f"{self.path}.1"
+        self.journal.compact(config.CONVERSATION_RESUME_TURNS, archive=archive)
+
+        # Shift older archives up by one, dropping the oldest
+        for i in range(self.archives, 0, -1):
+            older = f"{self.path}.{i}.gz"
+            if os.path.exists(older):
+                if i == self.archives:
+                    os.remove(older)
+                else:
+                    os.replace(older, f"{self.path}.{i + 1}.gz")
+        if self.archives > 0:
+            with open(archive, 'rb') as src, gzip.open(f"{archive}.gz", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+        os.remove(archive)
+
+    def _migrate(self):
+        """Import the JSON history written by older versions, once."""
+        if self._migrated:
+            return
+        self._migrated = True
+        legacy = os.path.join(os.path.dirname(self.path), "conversation_history.json")
+        if os.path.exists(legacy) and not os.path.exists(self.path):
+            history = utils.load_json(legacy).get('history', [])
+            self.journal.append_many(history)
+            self.journal.sync()
+            os.replace(legacy, legacy + ".migrated")
+
+    def close(self):
+        with self._lock:
+            self.journal.close()
@@ -0,0 +1,101 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Dict
+import config
+
+class EmbeddingCache:
+    """Two-tier embedding cache keyed by (model, sha256(text)).
+
+    A bounded in-memory LRU sits in front of a persistent SQLite table, so
+    repeated queries and re-created documents skip the embedding API.
+    """
+
+    def __init__(self, path: Optional[str] = config.EMBEDDINGS_CACHE,
+                 max_entries: int = config.EMBEDDINGS_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._db = None
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def key(text: str, model: str = config.EMBEDDING_MODEL) -> tuple:
+        return (model, hashlib.sha256(text.encode('utf-8')).hexdigest())
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Open the disk tier on first use."""
+        if self._db is None and self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, hash))"
+            )
+            self._db.commit()
+        return self._db
+
+    def _remember(self, key: tuple, vector: List[float]):
+        """Insert into the memory tier, evicting the least recently used."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def get(self, text: str, model: str = config.EMBEDDING_MODEL) -> Optional[List[float]]:
+        """Look up a cached embedding."""
+        key = self.key(text, model)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats['hits'] += 1
+                return self._memory[key]
+
+            db = self._connect()
+            row = None
+            if db is not None:
+                row = db.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND hash = ?", key
+                ).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+
+            vector = array('f', row[0]).tolist()
+            self._remember(key, vector)
+            self.stats['disk_hits'] += 1
+            return vector
+
+    def put(self, text: str, vector: List[float], model: str = config.EMBEDDING_MODEL):
+        """Store an embedding in both tiers."""
+        if not vector:
+            return
+        key = self.key(text, model)
+        with self._lock:
+            self._remember(key, vector)
+            db = self._connect()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)",
+                    key + (array('f', vector).tobytes(),)
+                )
+                db.commit()
+
+    def hit_rate(self) -> float:
+        lookups = self.stats['hits'] + self.stats['disk_hits'] + self.stats['misses']
+        return (self.stats['hits'] + self.stats['disk_hits']) / lookups if lookups else 0.0
+
+    def get_stats(self) -> Dict[str, float]:
+        return dict(self.stats, size=len(self._memory), hit_rate=self.hit_rate())
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,104 @@
+from typing import Optional
+import config
+
+class HoltForecaster:
+    """Holt's linear trend (double exponential smoothing) for irregular samples.
+
+    Keeps a smoothed level and a per-second trend, both updated in O(1).
+    With `beta=0` it reduces to a plain EWMA of the level.
+    """
+
+    def __init__(self, alpha: float = config.FORECAST_ALPHA, beta: float = config.FORECAST_BETA):
+        self.alpha = alpha
+        self.beta = beta
+        self.level = 0.0
+        self.trend = 0.0
+        self.last_time: Optional[float] = None
+        self.count = 0
+
+    def update(self, timestamp: float, value: float):
+        if self.last_time is None:
+            self.level = value
+        else:
+            dt = timestamp - self.last_time
+            if dt <= 0:
+                return
+            previous = self.level
+            self.level = self.alpha * value + (1 - self.alpha) * (self.level + self.trend * dt)
+            self.trend = self.beta * (self.level - previous) / dt + (1 - self.beta) * self.trend
+        self.last_time = timestamp
+        self.count += 1
+
+    def forecast(self, seconds_ahead: float) -> float:
+        """Predicted value `seconds_ahead` after the last sample."""
+        return self.level + self.trend * seconds_ahead
+
+class RollingStats:
+    """Mean and variance over the last `window` samples, updated in O(1).
+
+    Values live in a preallocated NumPy ring buffer; running sums are
+    recomputed exactly once per lap to stop floating-point drift.
+    """
+
+    def __init__(self, window: int = config.ANOMALY_WINDOW):
+        import numpy as np
+        self.window = window
+        self.values = np.zeros(window)
+        self.count = 0
+        self._sum = 0.0
+        self._sum_sq = 0.0
+
+    def __len__(self) -> int:
+        return min(self.count, self.window)
+
+    def update(self, value: float):
+        slot = self.count % self.window
+        if self.count >= self.window:
+            old = self.values[slot]
+            self._sum -= old
+            self._sum_sq -= old * old
+        self.values[slot] = value
+        self._sum += value
+        self._sum_sq += value * value
+        self.count += 1
+
+        if slot == self.window - 1:
+            self._sum = float(self.values.sum())
+            self._sum_sq = float((self.values * self.values).sum())
+
+    @property
+    def mean(self) -> float:
+        n = len(self)
+        return self._sum / n if n else 0.0
+
+    @property
+    def variance(self) -> float:
+        n = len(self)
+        if n < 2:
+            return 0.0
+        return max(0.0, (self._sum_sq - self._sum * self._sum / n) / (n - 1))
+
+    @property
+    def std(self) -> float:
+        return self.variance ** 0.5
+
+    def zscore(self, value: float) -> float:
+        """Standard score of `value` against the window (0 if undefined)."""
+        std = self.std
+        return (value - self.mean) / std if std > 0 else 0.0
+
+class RateConverter:
+    """Turns a monotonically increasing counter into a per-second rate."""
+
+    def __init__(self):
+        self.last_time: Optional[float] = None
+        self.last_value: Optional[float] = None
+
+    def update(self, timestamp: float, counter: float) -> Optional[float]:
+        """Rate since the previous reading, or None for the first reading or a counter reset."""
+        rate = None
+        if self.last_time is not None and timestamp > self.last_time and counter >= self.last_value:
+            rate = (counter - self.last_value) / (timestamp - self.last_time)
+        self.last_time = timestamp
+        self.last_value = counter
+        return rate
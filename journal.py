@@ -0,0 +1,228 @@
+import os
+import json
+import shutil
+from typing import Dict, Any, Iterable, List, Optional
+import config
+from storage import FileLock, Flusher, atomic_write
+
+class Journal:
+    """Append-only JSON-lines journal.
+
+    Each entry is written as one line. A crash can only leave a torn final
+    line, which is dropped (and trimmed from the file) when the journal is
+    replayed or reopened.
+
+    Appends reach the OS immediately; when they are fsynced depends on
+    `durability` (see `storage.Flusher`), and closing always syncs. Writers
+    take an advisory lock on `<path>.lock`, so processes sharing the
+    journal don't interleave or lose writes. `offset` tracks how much of
+    the file this instance has seen, so `read_new` can pick up entries
+    other writers appended since.
+    """
+
+    TAIL_BLOCK = 64 * 1024
+
+    def __init__(self, path: str, durability: str = config.DURABILITY,
+                 flush_delay: float = config.FLUSH_DELAY):
+        self.path = path
+        self.lock = FileLock(f"{path}.lock")
+        self.flusher = Flusher(self._fsync, durability, flush_delay)
+        self.entries_since_reset = 0
+        self.offset = 0  # bytes of the journal file read (or written) by this instance
+        self._file = None
+        # File `offset` refers to; kept open so its inode can't be reused by a replacement
+        self._reader = None
+
+    def _open(self):
+        if self._file is not None and self._replaced():
+            self._file.close()
+            self._file = None
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._trim_torn_tail()
+            self._file = open(self.path, 'a', encoding='utf-8')
+        return self._file
+
+    def _replaced(self, f=None) -> bool:
+        """Whether another process compacted the journal into a new file."""
+        f = f if f is not None else self._file
+        try:
+            return os.stat(self.path).st_ino != os.fstat(f.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _set_reader(self, f, offset: int):
+        if self._reader is not None:
+            self._reader.close()
+        self._reader, self.offset = f, offset
+
+    def _trim_torn_tail(self):
+        """Cut a partial last line so new entries start on a fresh line."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r+b') as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                step = min(self.TAIL_BLOCK, pos)
+                f.seek(pos - step)
+                block = f.read(step)
+                newline = block.rfind(b'\n')
+                if newline >= 0:
+                    pos = pos - step + newline + 1
+                    break
+                pos -= step
+            if pos < end:
+                f.truncate(pos)
+
+    @property
+    def size(self) -> int:
+        """Bytes in the journal file."""
+        if self._file is not None:
+            return self._file.tell()
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def append(self, entry: Dict[str, Any]):
+        """Append one entry."""
+        self.append_many([entry])
+
+    def append_many(self, entries: Iterable[Dict[str, Any]]):
+        """Append several entries with a single write."""
+        lines = ''.join(json.dumps(e, default=str) + '\n' for e in entries)
+        if not lines:
+            return
+        with self.lock:
+            f = self._open()
+            st = os.fstat(f.fileno())
+            caught_up = (self._reader is not None and st.st_size == self.offset
+                         and st.st_ino == os.fstat(self._reader.fileno()).st_ino)
+            f.write(lines)
+            f.flush()
+            if caught_up:
+                self.offset = os.fstat(f.fileno()).st_size
+            self.entries_since_reset += lines.count('\n')
+        self.flusher.mark_dirty()
+
+    def _fsync(self):
+        with self.lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def sync(self):
+        """Force appended entries to stable storage now."""
+        self.flusher.flush()
+
+    def replay(self) -> List[Dict[str, Any]]:
+        """Read all complete entries, trimming a torn or corrupt tail."""
+        if not os.path.exists(self.path):
+            return []
+
+        f = open(self.path, 'rb')
+        data = f.read()
+
+        entries, good_bytes = self._parse(data)
+        if good_bytes < len(data):
+            with self.lock:
+                self.close()
+                with open(self.path, 'r+b') as trim:
+                    trim.truncate(good_bytes)
+
+        self._set_reader(f, good_bytes)
+        self.entries_since_reset = len(entries)
+        return entries
+
+    def read_new(self) -> Optional[List[Dict[str, Any]]]:
+        """Read the entries appended since this instance last read the journal.
+
+        Returns None if the file was replaced in the meantime (another
+        writer checkpointed or compacted it) or was never read; `replay()`
+        it then.
+        """
+        with self.lock:
+            if self._reader is None or self._replaced(self._reader):
+                return None
+            self._reader.seek(self.offset)
+            data = self._reader.read()
+            entries, good_bytes = self._parse(data)
+            self.offset += good_bytes
+            self.entries_since_reset += len(entries)
+            return entries
+
+    @staticmethod
+    def _parse(data: bytes):
+        """Complete entries at the start of `data`, and the bytes they span."""
+        entries = []
+        good_bytes = 0
+        for line in data.split(b'\n')[:-1]:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # Everything after a bad line is untrustworthy
+                break
+            good_bytes += len(line) + 1
+        return entries, good_bytes
+
+    def tail(self, n: int) -> List[Dict[str, Any]]:
+        """Read the last `n` complete entries without reading the whole file."""
+        if n <= 0 or not os.path.exists(self.path):
+            return []
+
+        with open(self.path, 'rb') as f:
+            pos = f.seek(0, os.SEEK_END)
+            data = b''
+            # One extra newline is needed: the first line read may be partial
+            while pos > 0 and data.count(b'\n') <= n:
+                step = min(self.TAIL_BLOCK, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+
+        lines = data.split(b'\n')[:-1]  # drop a torn (or empty) last line
+        if pos > 0:
+            lines = lines[1:]
+        entries = []
+        for line in lines[-n:]:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+
+    def compact(self, keep: int, archive: Optional[str] = None):
+        """Rewrite the journal with only its last `keep` entries.
+
+        The previous file is moved to `archive` if given, else deleted.
+        """
+        with self.lock:
+            entries = self.tail(keep)
+            self.close()
+            if archive is not None and os.path.exists(self.path):
+                # Link (or copy) first: the journal path must exist at all times
+                try:
+                    os.link(self.path, archive)
+                except OSError:
+                    shutil.copyfile(self.path, archive)
+            atomic_write(self.path, ''.join(json.dumps(e, default=str) + '\n' for e in entries))
+            self.entries_since_reset = len(entries)
+
+    def reset(self):
+        """Discard all entries (after they were checkpointed).
+
+        The file is replaced rather than truncated, so other instances
+        notice (see `read_new`).
+        """
+        with self.lock:
+            self.close()
+            atomic_write(self.path, '')
+            self._set_reader(open(self.path, 'rb'), 0)
+            self.entries_since_reset = 0
+
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                self.flusher.flush()
+                self._file.close()
+                self._file = None
+            if self._reader is not None:
+                self._set_reader(None, 0)
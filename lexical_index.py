@@ -0,0 +1,92 @@
+import re
+import math
+import heapq
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple, Iterable
+import config
+
+STOPWORDS = {
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'is', 'are',
+    'was', 'be', 'it', 'this', 'that', 'with', 'as', 'by', 'from', 'me', 'my', 'i', 'you',
+    'all', 'any', 'about', 'find', 'search', 'show', 'get', 'related', 'document', 'documents',
+    'file', 'files', 'what', 'which', 'where'
+}
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords."""
+    return [t for t in re.findall(r'\w+', text.lower()) if t not in STOPWORDS]
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = config.RRF_K) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: each id scores the sum of 1 / (k + rank)."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
+class LexicalIndex:
+    """In-memory inverted index scored with BM25.
+
+    Documents are indexed by their content plus their tags (tags count
+    `tag_weight` times). Adding a document that is already indexed
+    replaces it, so the index can be maintained on every create and update.
+    """
+
+    def __init__(self, k1: float = config.BM25_K1, b: float = config.BM25_B,
+                 tag_weight: int = config.BM25_TAG_WEIGHT):
+        self.k1 = k1
+        self.b = b
+        self.tag_weight = tag_weight
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.lengths: Dict[str, int] = {}
+        self.total_length = 0
+        self._terms: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.lengths
+
+    def add(self, doc_id: str, text: str, tags: Iterable[str] = ()):
+        """Index (or re-index) one document."""
+        counts = Counter(tokenize(text))
+        for tag in tags:
+            for token in tokenize(tag):
+                counts[token] += self.tag_weight
+        with self._lock:
+            self._remove(doc_id)
+            for term, tf in counts.items():
+                self.postings[term][doc_id] = tf
+            self._terms[doc_id] = list(counts)
+            self.lengths[doc_id] = sum(counts.values())
+            self.total_length += self.lengths[doc_id]
+
+    def _remove(self, doc_id: str):
+        for term in self._terms.pop(doc_id, ()):
+            postings = self.postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(doc_id, 0)
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """Top `limit` documents for `query` as (doc_id, score), best first."""
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self.lengths)
+            if not n or not terms:
+                return []
+            avg_length = self.total_length / n
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(limit, scores.items(), key=lambda x: x[1])
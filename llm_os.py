@@ -3,17 +3,22 @@
 LLM OS - A Simple AI-Native Operating System Demo
 """
 
-import os
 import sys
 import time
+import asyncio
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, TextIO
 import json
-import openai
 
 import config
 import utils
 from agents import AgentCoordinator
+from context_manager import ContextManager, count_tokens
+from conversation_log import ConversationLog
 from semantic_storage import SemanticFileSystem
 from resource_manager import PredictiveResourceManager
 
@@ -29,26 +34,23 @@ class LLMOS:
             sys.exit(1)
         
         # Test API connection
-        print(utils.format_system_message("Testing OpenAI API connection..."))
-        try:
-            test_client = openai.OpenAI(api_key=config.OPENAI_API_KEY)
-            # Simple test to verify API key works
-            models = test_client.models.list()
+        if config.FAST_START:
+            # Verify the key in the background instead of blocking startup
+            threading.Thread(target=self._check_api_connection, daemon=True).start()
+        else:
+            print(utils.format_system_message("Testing OpenAI API connection..."))
+            if not self._check_api_connection():
+                sys.exit(1)
             print(utils.format_system_message("API connection successful!"))
-        except openai.AuthenticationError:
-            print(utils.format_error("Invalid OpenAI API key! Please check your API key."))
-            sys.exit(1)
-        except openai.APIConnectionError:
-            print(utils.format_error("Failed to connect to OpenAI API. Check your internet connection."))
-            sys.exit(1)
-        except Exception as e:
-            print(utils.format_error(f"Unexpected error connecting to OpenAI API: {str(e)}"))
-            sys.exit(1)
         
         # Initialize components
         try:
             self.coordinator = AgentCoordinator()
-            self.conversation_history = []
+            self.coordinator.rm.start()
+            self._loop = None
+            self.conversation = ContextManager()
+            self.conversation_log = ConversationLog()
+            self._resumed = False
             self.context = {
                 'session_start': utils.timestamp(),
                 'user_profile': {}
@@ -61,6 +63,21 @@ class LLMOS:
         print(utils.format_system_message("Type 'help' for available commands or just chat naturally."))
         print()
     
+    def _check_api_connection(self) -> bool:
+        """Verify the API key works, printing the problem if it does not."""
+        import openai
+        try:
+            # Simple test to verify API key works
+            utils.get_client().models.list()
+            return True
+        except openai.AuthenticationError:
+            print(utils.format_error("Invalid OpenAI API key! Please check your API key."))
+        except openai.APIConnectionError:
+            print(utils.format_error("Failed to connect to OpenAI API. Check your internet connection."))
+        except Exception as e:
+            print(utils.format_error(f"Unexpected error connecting to OpenAI API: {str(e)}"))
+        return False
+    
     def run(self):
         """Main interaction loop."""
         while True:
@@ -81,6 +98,11 @@ class LLMOS:
                     self.show_help()
                     continue
                 
+                # Check for stats
+                if user_input.lower() == 'stats':
+                    self.show_stats()
+                    continue
+                
                 # Process command
                 self.process_command(user_input)
                 
@@ -94,63 +116,102 @@ class LLMOS:
     def process_command(self, command: str):
         """Process a user command."""
         try:
+            usage_before = utils.usage_tracker.snapshot()
+            self._resume_conversation()
+            
             # Add to history
-            self.conversation_history.append({
-                'role': 'user',
-                'content': command,
-                'timestamp': utils.timestamp()
-            })
+            self._add_turn('user', command)
             
             # Build context
             context = self._build_context()
             
             # Route to appropriate agent
-            agent_name, response = self.coordinator.route_command(command, context)
+            if config.ASYNC_PIPELINE:
+                agent_name, response = self._run_async(
+                    self.coordinator.route_command_async(command, context)
+                )
+            else:
+                agent_name, response = self.coordinator.route_command(
+                    command, context, stream=config.STREAM_RESPONSES
+                )
             
             # Display response
-            print(utils.format_agent_response(agent_name, response))
+            if isinstance(response, str):
+                print(utils.format_agent_response(agent_name, response))
+            else:
+                response = self._render_stream(agent_name, response)
             print()
             
-            # Add to history
-            self.conversation_history.append({
-                'role': 'assistant',
-                'agent': agent_name,
-                'content': response,
-                'timestamp': utils.timestamp()
-            })
+            # Add to history; old turns are summarized to stay within the token budget
+            self._add_turn('assistant', response, agent=agent_name)
             
-            # Trim history if too long
-            if len(self.conversation_history) > config.MAX_CONVERSATION_HISTORY * 2:
-                self.conversation_history = self.conversation_history[-config.MAX_CONVERSATION_HISTORY:]
+            if config.SHOW_TOKEN_USAGE:
+                self._report_usage(context, utils.usage_tracker.since(usage_before))
                 
-        except openai.RateLimitError:
-            print(utils.format_error("Rate limit reached. Please wait a moment and try again."))
-        except openai.APIError as e:
-            print(utils.format_error(f"OpenAI API error: {str(e)}"))
         except Exception as e:
-            print(utils.format_error(f"Error processing command: {str(e)}"))
+            print(utils.format_error(self._describe_error(e)))
+    
+    def _add_turn(self, role: str, content: str, **fields):
+        """Add a turn to the context and append it to the conversation journal."""
+        entry = {'role': role, 'content': content, **fields, 'timestamp': utils.timestamp()}
+        self.conversation.add(**entry)
+        try:
+            self.conversation_log.append(entry)
+        except OSError as e:
+            print(utils.format_error(f"Failed to save conversation turn: {str(e)}"))
+    
+    def _resume_conversation(self):
+        """Load the end of the previous sessions into the context, once."""
+        if self._resumed:
+            return
+        self._resumed = True
+        try:
+            for entry in self.conversation_log.recent():
+                if entry.get('role') in ('user', 'assistant') and isinstance(entry.get('content'), str):
+                    self.conversation.add(**entry)
+        except OSError as e:
+            print(utils.format_error(f"Failed to resume conversation: {str(e)}"))
+    
+    def _describe_error(self, error: Exception) -> str:
+        """User-facing message for an error raised while processing a command."""
+        import openai
+        if isinstance(error, openai.RateLimitError):
+            return "Rate limit reached. Please wait a moment and try again."
+        if isinstance(error, openai.APIError):
+            return f"OpenAI API error: {str(error)}"
+        return f"Error processing command: {str(error)}"
+    
+    def _run_async(self, coro):
+        """Run a coroutine on the session's event loop."""
+        # One loop for the whole session keeps the async client's connections alive
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coro)
+    
+    def _render_stream(self, agent_name: str, deltas) -> str:
+        """Print a streamed response as it arrives and return the full text."""
+        print(utils.format_agent_response(agent_name, ""), end="", flush=True)
+        parts = []
+        for delta in deltas:
+            parts.append(delta)
+            print(delta, end="", flush=True)
+        print()
+        return "".join(parts)
     
     def _build_context(self) -> str:
         """Build context from conversation history."""
-        recent_history = self.conversation_history[-config.MAX_CONVERSATION_HISTORY:]
-        
-        context_parts = []
-        
-        # Add recent conversation
-        if recent_history:
-            conv = []
-            for entry in recent_history:
-                role = entry['role']
-                content = entry['content']
-                conv.append(f"{role}: {content}")
-            
-            context_parts.append("Recent conversation:\n" + "\n".join(conv))
-        
-        # Add system context
-        context_parts.append(f"Current time: {utils.timestamp()}")
-        context_parts.append(f"Session duration: {self._get_session_duration()}")
-        
-        return "\n\n".join(context_parts)
+        return self.conversation.build([
+            f"Current time: {utils.timestamp()}",
+            f"Session duration: {self._get_session_duration()}"
+        ])
+    
+    def _report_usage(self, context: str, usage: Dict[str, Any]):
+        """Print the tokens and cost of the last command."""
+        print(utils.format_system_message(
+            f"[{usage['requests']} API calls, {usage['prompt_tokens']} prompt + "
+            f"{usage['completion_tokens']} completion tokens, ${usage['cost']:.4f}; "
+            f"context {count_tokens(context)}/{config.MAX_CONTEXT_LENGTH} tokens]"
+        ))
     
     def _get_session_duration(self) -> str:
         """Get session duration as string."""
@@ -190,31 +251,194 @@ GENERAL ASSISTANCE:
 
 SYSTEM COMMANDS:
 - help - Show this help message
+- stats - Show cache and performance statistics
 - exit/quit/shutdown - Exit the LLM OS
 
 You can also just chat naturally - the system will understand and route your request appropriately!
 """
         print(utils.format_system_message(help_text))
     
+    def show_stats(self):
+        """Show cache and performance statistics."""
+        cache = utils.embedding_cache.get_stats()
+        lines = [
+            "Performance statistics:",
+            f"- Embedding cache: {cache['hit_rate']:.0%} hit rate "
+            f"({cache['hits']} memory hits, {cache['disk_hits']} disk hits, "
+            f"{cache['misses']} misses, {cache['evictions']} evictions, {cache['size']} in memory)"
+        ]
+        responses = utils.response_cache.get_stats()
+        lines.append(
+            f"- Response cache: {responses['hit_rate']:.0%} hit rate "
+            f"({responses['hits']} memory hits, {responses['disk_hits']} disk hits, "
+            f"{responses['misses']} misses, {responses['expired']} expired, {responses['size']} in memory)"
+        )
+        for name, router in [("Agent routing", self.coordinator.router),
+                             ("File action routing", self.coordinator.file_agent.router)]:
+            routing = router.get_stats()
+            lines.append(
+                f"- {name}: {routing['routed']} commands, {routing['fallback_rate']:.0%} LLM fallback, "
+                f"{routing['avg_ms']:.0f} ms average"
+            )
+        ttft = self.coordinator.get_ttft_stats()
+        lines.append(f"- Time to first token: {ttft['avg_ms']:.0f} ms average over {ttft['count']} streamed responses")
+        usage = utils.usage_tracker.snapshot()
+        lines.append(
+            f"- API usage: {usage['requests']} requests, {usage['prompt_tokens']} prompt + "
+            f"{usage['completion_tokens']} completion tokens, ${usage['cost']:.4f}"
+        )
+        limits = utils.rate_limiter.get_stats()
+        lines.append(
+            f"- Rate limiter: {limits['queue_depth']} waiting (peak {limits['max_queue_depth']}), "
+            f"{limits['throttled']} requests throttled for {limits['throttle_wait_s']:.1f}s, "
+            f"{limits['retries']} retries, {limits['rate_limited']} rate-limit responses, {limits['failures']} failures"
+        )
+        lines.append(
+            f"- Context: {self.conversation.tokens} tokens in {len(self.conversation)} recent turns, "
+            f"{self.conversation.evicted} older turns summarized"
+        )
+        print(utils.format_system_message("\n".join(lines)))
+        print()
+    
     def shutdown(self):
         """Shutdown the OS."""
         print(utils.format_system_message("Shutting down LLM OS..."))
         
         try:
-            # Save conversation history
-            history_file = os.path.join(config.STORAGE_PATH, "conversation_history.json")
-            utils.save_json({
-                'history': self.conversation_history,
-                'context': self.context
-            }, history_file)
+            # Sync the conversation journal
+            self.conversation_log.close()
             print(utils.format_system_message("Conversation history saved."))
         except Exception as e:
             print(utils.format_error(f"Failed to save history: {str(e)}"))
         
+        # Stop background resource sampling
+        self.coordinator.rm.stop()
+        
+        try:
+            # Checkpoint the metadata journal
+            self.coordinator.fs.close()
+        except Exception as e:
+            print(utils.format_error(f"Failed to checkpoint file metadata: {str(e)}"))
+        
         print(utils.format_system_message("Goodbye!"))
 
+def read_commands(source: TextIO) -> Iterator[Dict[str, Any]]:
+    """Commands from JSONL lines ({"command": ..., "context": ..., "id": ...}) or plain text lines."""
+    for line in source:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            item = line
+        yield item if isinstance(item, dict) else {'command': str(item)}
+
+def run_batch(source: TextIO, output: TextIO, workers: int = config.BATCH_WORKERS,
+              ordered: bool = False) -> Dict[str, Any]:
+    """Process commands headlessly on a pool of `workers` threads.
+    
+    Each result is written to `output` as one JSON line with the agent,
+    response and latency, either in input order or as soon as it completes.
+    At most `workers * 2` commands are read ahead of the slowest one.
+    """
+    if not config.OPENAI_API_KEY:
+        raise RuntimeError("OpenAI API key not found! Set OPENAI_API_KEY environment variable.")
+    coordinator = AgentCoordinator()
+    latencies = []
+    errors = 0
+    
+    def execute(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        result = {'index': index}
+        if 'id' in item:
+            result['id'] = item['id']
+        result['command'] = item.get('command')
+        start = time.perf_counter()
+        try:
+            if not isinstance(result['command'], str) or not result['command'].strip():
+                raise ValueError("missing 'command'")
+            agent_name, response = coordinator.route_command(result['command'], item.get('context', ''))
+            result['agent'] = agent_name
+            result['response'] = response
+        except Exception as e:
+            result['error'] = str(e)
+        result['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+    
+    def emit(result: Dict[str, Any]):
+        nonlocal errors
+        latencies.append(result['latency_ms'])
+        errors += 'error' in result
+        output.write(json.dumps(result, default=str) + "\n")
+        output.flush()
+    
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for index, item in enumerate(read_commands(source)):
+                pending.append(pool.submit(execute, index, item))
+                while len(pending) >= workers * 2:
+                    if ordered:
+                        emit(pending.popleft().result())
+                    else:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            pending.remove(future)
+                            emit(future.result())
+            while pending:
+                if ordered:
+                    emit(pending.popleft().result())
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                        emit(future.result())
+    finally:
+        coordinator.fs.close()
+    
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'commands': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 2),
+        'commands_per_sec': round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        'p50_ms': latencies[len(latencies) // 2] if latencies else 0.0,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+    }
+
 def main():
     """Main entry point."""
+    parser = argparse.ArgumentParser(description="LLM OS - AI-Native Operating System Demo")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="run commands from a JSONL or text file ('-' for stdin) without the interactive prompt")
+    parser.add_argument("--workers", type=int, default=config.BATCH_WORKERS,
+                        help="commands processed in parallel in batch mode")
+    parser.add_argument("--ordered", action="store_true",
+                        help="write batch results in input order instead of as they complete")
+    parser.add_argument("--output", metavar="FILE", help="write batch results here instead of stdout")
+    args = parser.parse_args()
+    
+    if args.batch:
+        source = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+        output = sys.stdout if not args.output else open(args.output, "w", encoding="utf-8")
+        try:
+            summary = run_batch(source, output, max(1, args.workers), args.ordered)
+        except Exception as e:
+            print(utils.format_error(str(e)), file=sys.stderr)
+            sys.exit(1)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if output is not sys.stdout:
+                output.close()
+        print(utils.format_system_message(
+            f"{summary['commands']} commands ({summary['errors']} failed) in {summary['seconds']}s, "
+            f"{summary['commands_per_sec']}/s, latency p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms"
+        ), file=sys.stderr)
+        return
+    
     print(config.COLOR_SYSTEM)
     print("=" * 60)
     print("   LLM OS - AI-Native Operating System Demo")
@@ -226,4 +450,4 @@ def main():
     os_instance.run()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Load test for the LLM OS server
+
+Starts a stub OpenAI-compatible model server and an LLM OS server pointed
+at it (through OPENAI_BASE_URL), then drives many concurrent sessions and
+reports throughput, latency percentiles and rejected (503) requests.
+Run `python load_test.py --help` for the options.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import socket
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+from typing import Dict, Any, List, Tuple
+
+from server import LLMOSServer
+
+COMMANDS = [
+    "Create a document about {topic}",
+    "Find documents about {topic}",
+    "Show me recent documents",
+    "What's my CPU usage?",
+    "Which processes use the most memory?",
+    "Remember that I prefer {topic}",
+    "Give me three tips about {topic}",
+]
+TOPICS = ["python", "gardening", "budget planning", "travel in japan", "machine learning", "cooking pasta"]
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class StubModelServer:
+    """Minimal OpenAI-compatible API: models, embeddings and chat completions.
+
+    Embeddings are hashed bags of words, so similar texts get similar
+    vectors. Chat completions answer classification prompts by keyword and
+    everything else with filler text, after `latency` seconds.
+    """
+
+    DIM = 256
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.requests = 0
+
+    def embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.DIM
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.DIM] += 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    @staticmethod
+    def reply(prompt: str) -> str:
+        text = prompt.lower()
+        command = text.split("command:", 1)[-1]
+        if "category:" in text:
+            if any(w in command for w in ("document", "file", "create", "find")):
+                return "FILE"
+            if any(w in command for w in ("cpu", "memory", "process", "usage")):
+                return "SYSTEM"
+            return "GENERAL"
+        if "action:" in text:
+            for word, action in (("create", "CREATE"), ("find", "SEARCH"), ("recent", "LIST")):
+                if word in command:
+                    return action
+            return "ORGANIZE"
+        if "respond with only a json object" in text:
+            return json.dumps({"key": "preference", "value": "stub value"})
+        return "This is a stub response. " * 20
+
+    async def handle(self, method: str, path: str, body: bytes) -> Tuple[int, Any]:
+        self.requests += 1
+        if path.endswith("/models"):
+            return 200, {"object": "list", "data": [{"id": "stub", "object": "model", "created": 0, "owned_by": "stub"}]}
+
+        request = json.loads(body or b"{}")
+        if path.endswith("/embeddings"):
+            inputs = request["input"] if isinstance(request["input"], list) else [request["input"]]
+            tokens = sum(len(t.split()) for t in inputs)
+            return 200, {
+                "object": "list", "model": request.get("model", "stub"),
+                "data": [{"object": "embedding", "index": i, "embedding": self.embed(t)} for i, t in enumerate(inputs)],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+            }
+
+        if path.endswith("/chat/completions"):
+            await asyncio.sleep(self.latency)
+            prompt = request["messages"][-1]["content"]
+            content = self.reply(prompt)
+            prompt_tokens = sum(len(m["content"]) // 4 for m in request["messages"])
+            completion_tokens = len(content) // 4
+            if request.get("stream"):
+                return 200, ("stream", content, request.get("model", "stub"))
+            return 200, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens}
+            }
+        return 404, {"error": {"message": "not found"}}
+
+    async def connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await LLMOSServer._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self.handle(method, path, body or b"")
+                if isinstance(payload, tuple):
+                    # Server-sent events, ending the connection
+                    _, content, model = payload
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nConnection: close\r\n\r\n")
+                    for word in content.split(" "):
+                        chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                                 "model": model, "choices": [{"index": 0, "delta": {"content": word + " "},
+                                                              "finish_reason": None}]}
+                        writer.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    writer.write(b"data: [DONE]\n\n")
+                    await writer.drain()
+                    break
+                data = json.dumps(payload).encode()
+                writer.write(f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def start(self, port: int):
+        """Serve on a daemon thread with its own event loop."""
+        ready = threading.Event()
+
+        async def run():
+            server = await asyncio.start_server(self.connection, "127.0.0.1", port, backlog=1024)
+            ready.set()
+            async with server:
+                await server.serve_forever()
+
+        threading.Thread(target=lambda: asyncio.run(run()), daemon=True).start()
+        ready.wait(5)
+
+async def request(reader, writer, method: str, path: str, payload: Dict[str, Any] = None) -> Tuple[int, Dict[str, Any]]:
+    """Send one keep-alive HTTP request and read the JSON response."""
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+    data = await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, json.loads(data) if data else {}
+
+async def run_session(host: str, port: int, commands: int, retries: int, results: Dict[str, Any]):
+    """One user: a session sending `commands` commands back to back."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        status, created = await request(reader, writer, "POST", "/sessions")
+        session = created.get("session")
+        for _ in range(commands):
+            command = random.choice(COMMANDS).format(topic=random.choice(TOPICS))
+            start = time.perf_counter()
+            for attempt in range(retries + 1):
+                status, _ = await request(reader, writer, "POST", "/command", {"command": command, "session": session})
+                if status != 503:
+                    break
+                results["rejected"] += 1
+                await asyncio.sleep(random.uniform(0.5, 1.5) * 2 ** attempt * 0.1)
+            if status == 200:
+                results["latencies"].append((time.perf_counter() - start) * 1000)
+            else:
+                results["failed"] += 1
+    finally:
+        writer.close()
+
+async def run_load(host: str, port: int, sessions: int, commands: int, retries: int) -> Dict[str, Any]:
+    results = {"latencies": [], "rejected": 0, "failed": 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(host, port, commands, retries, results) for _ in range(sessions)))
+    results["seconds"] = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, results["health"] = await request(reader, writer, "GET", "/health")
+    writer.close()
+    return results
+
+def wait_for_server(host: str, port: int, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            sys.exit(f"Server exited with code {process.returncode}")
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    sys.exit("Server did not start in time")
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM OS server load test")
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent users")
+    parser.add_argument("--commands", type=int, default=10, help="commands per user")
+    parser.add_argument("--model-latency", type=float, default=0.2, help="stub chat completion latency in seconds")
+    parser.add_argument("--max-concurrent", type=int, default=16, help="server command concurrency")
+    parser.add_argument("--max-queue", type=int, default=64, help="server queue before 503")
+    parser.add_argument("--retries", type=int, default=3, help="retries of a rejected command")
+    parser.add_argument("--url", help="test an already running server (host:port) instead of starting one")
+    args = parser.parse_args()
+
+    process = storage = None
+    if args.url:
+        host, port = args.url.rsplit(":", 1)
+        port = int(port)
+    else:
+        stub_port, host, port = free_port(), "127.0.0.1", free_port()
+        stub = StubModelServer(args.model_latency)
+        stub.start(stub_port)
+        storage = tempfile.mkdtemp(prefix="llm_os_load_")
+        env = dict(os.environ, OPENAI_API_KEY="sk-stub", OPENAI_BASE_URL=f"http://127.0.0.1:{stub_port}/v1",
+                   LLM_OS_STORAGE=storage, OPENAI_EMBEDDING_MODEL="stub-embedding")
+        here = os.path.dirname(os.path.abspath(__file__))
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(here, "server.py"), "--port", str(port),
+             "--max-concurrent", str(args.max_concurrent), "--max-queue", str(args.max_queue)],
+            env=env, cwd=here, stdout=subprocess.DEVNULL
+        )
+        print(f"Stub model server on :{stub_port} ({args.model_latency * 1000:.0f} ms per completion), "
+              f"LLM OS server on :{port}")
+
+    try:
+        wait_for_server(host, port, process)
+        results = asyncio.run(run_load(host, port, args.sessions, args.commands, args.retries))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+        if storage is not None:
+            shutil.rmtree(storage, ignore_errors=True)
+
+    latencies = sorted(results["latencies"])
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+    print(f"\n{args.sessions} sessions x {args.commands} commands in {results['seconds']:.1f}s")
+    print(f"  completed:  {len(latencies)} ({len(latencies) / results['seconds']:.1f} commands/s)")
+    print(f"  rejected:   {results['rejected']} responses with 503 (retried up to {args.retries} times)")
+    print(f"  failed:     {results['failed']}")
+    print(f"  latency:    p50 {pct(0.5):.0f} ms, p95 {pct(0.95):.0f} ms, p99 {pct(0.99):.0f} ms")
+    print(f"  server:     {json.dumps(results['health'])}")
+
+if __name__ == "__main__":
+    main()
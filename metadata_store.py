@@ -0,0 +1,137 @@
+import heapq
+from typing import Dict, Any, List, Optional, Iterator
+import utils
+import config
+from journal import Journal
+from storage import atomic_write_json
+
+class MetadataStore:
+    """File metadata kept as a JSON snapshot plus a write-ahead journal.
+
+    Mutations (create, access, modify) are appended to the journal as small
+    records with absolute values, so replaying them is idempotent. Every
+    `checkpoint_interval` entries the full state is compacted into the
+    snapshot and the journal is reset. Several processes may share the
+    files: a checkpoint first applies the entries other writers appended.
+    """
+
+    def __init__(self, snapshot_file: str, journal_file: str,
+                 checkpoint_interval: int = config.METADATA_CHECKPOINT_INTERVAL):
+        self.snapshot_file = snapshot_file
+        self.journal = Journal(journal_file)
+        self.checkpoint_interval = checkpoint_interval
+        self._records = None
+    
+    @property
+    def records(self) -> Dict[str, Any]:
+        """All file records, loaded (snapshot plus journal replay) on first use."""
+        if self._records is None:
+            # Locked so another writer can't checkpoint between the two reads
+            with self.journal.lock:
+                self._records = utils.load_json(self.snapshot_file)
+                for entry in self.journal.replay():
+                    self._apply(entry)
+        return self._records
+
+    def _apply(self, entry: Dict[str, Any]):
+        """Apply one journal entry to the in-memory records."""
+        op = entry.get('op')
+        file_id = entry.get('id')
+        if op == 'create':
+            self._records[file_id] = entry['record']
+        elif file_id in self._records and op in ('access', 'modify'):
+            self._records[file_id].update(entry['fields'])
+
+    def _log(self, entries: List[Dict[str, Any]]):
+        """Journal and apply mutations, checkpointing when due."""
+        self.records  # replay the journal before appending to it
+        self.journal.append_many(entries)
+        for entry in entries:
+            self._apply(entry)
+        if self.journal.entries_since_reset >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def __contains__(self, file_id: str) -> bool:
+        return file_id in self.records
+
+    def __getitem__(self, file_id: str) -> Dict[str, Any]:
+        return self.records[file_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get(self, file_id: str) -> Optional[Dict[str, Any]]:
+        return self.records.get(file_id)
+
+    def values(self):
+        return self.records.values()
+
+    def recent(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Most recently accessed (or created) records."""
+        return heapq.nlargest(limit, self.records.values(),
+                              key=lambda x: x.get('last_accessed', x['created']))
+
+    def create(self, record: Dict[str, Any]):
+        """Add a new file record."""
+        self._log([{'op': 'create', 'id': record['id'], 'record': record}])
+
+    def create_many(self, records: List[Dict[str, Any]]):
+        """Add several file records with one journal write."""
+        self._log([{'op': 'create', 'id': r['id'], 'record': r} for r in records])
+
+    def record_access(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Bump the access count of a file and return its record."""
+        # Counted from the latest journal state, so other processes' accesses aren't lost
+        with self.journal.lock:
+            self.refresh()
+            if file_id not in self.records:
+                return None
+            fields = {
+                'access_count': self.records[file_id].get('access_count', 0) + 1,
+                'last_accessed': utils.timestamp()
+            }
+            self._log([{'op': 'access', 'id': file_id, 'fields': fields}])
+            return self.records[file_id]
+
+    def modify(self, file_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update fields of a file record."""
+        if file_id not in self.records:
+            return None
+        self._log([{'op': 'modify', 'id': file_id, 'fields': fields}])
+        return self.records[file_id]
+
+    @property
+    def lock(self):
+        """Lock shared by every process writing these files."""
+        return self.journal.lock
+
+    def refresh(self):
+        """Apply journal entries written by other processes since the last read."""
+        if self._records is None:
+            return
+        with self.journal.lock:
+            entries = self.journal.read_new()
+            if entries is None:
+                # Checkpointed by another writer: its snapshot has everything
+                self._records = None
+                self.records
+            else:
+                for entry in entries:
+                    self._apply(entry)
+
+    def checkpoint(self):
+        """Compact the journal into a fresh snapshot."""
+        # Held throughout so no other writer appends in between
+        with self.journal.lock:
+            self.refresh()
+            atomic_write_json(self.snapshot_file, self.records)
+            self.journal.reset()
+
+    def close(self):
+        """Checkpoint pending journal entries and release the journal."""
+        if self._records is not None and self.journal.entries_since_reset:
+            self.checkpoint()
+        self.journal.close()
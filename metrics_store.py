@@ -0,0 +1,120 @@
+import os
+import time
+import threading
+from typing import Dict, List, Tuple, Optional, Any
+import config
+
+class MetricsStore:
+    """Round-robin (RRD-style) on-disk store of resource metrics.
+
+    Each resolution is a fixed-size ring of buckets in its own memory-mapped
+    binary file, e.g. 5-second buckets for a day, 1-minute buckets for a
+    week and 1-hour buckets for a year. A bucket holds the sample count and
+    per-metric sums, so writes are O(1) per resolution and range queries
+    only touch the pages they read.
+    """
+
+    METRICS = ('cpu', 'memory', 'disk_io')
+
+    def __init__(self, path: str = config.METRICS_PATH,
+                 resolutions: List[Tuple[int, int]] = config.METRICS_RESOLUTIONS):
+        self.path = path
+        self.resolutions = sorted(resolutions)
+        self._rings = None
+        self._lock = threading.Lock()
+
+    def _dtype(self):
+        import numpy as np
+        return np.dtype([('bucket', 'f8'), ('count', 'f8')] + [(m, 'f8') for m in self.METRICS])
+
+    def _open(self) -> Dict[int, Any]:
+        """Map (creating if needed) one ring file per resolution."""
+        if self._rings is None:
+            import numpy as np
+            os.makedirs(self.path, exist_ok=True)
+            dtype = self._dtype()
+            rings = {}
+            for step, slots in self.resolutions:
+                filename = os.path.join(self.path, f"metrics_{step}s.rrd")
+                size = slots * dtype.itemsize
+                if not os.path.exists(filename) or os.path.getsize(filename) != size:
+                    # New ring, or the configured size changed
+                    with open(filename, 'wb') as f:
+                        f.truncate(size)
+                rings[step] = np.memmap(filename, dtype=dtype, mode='r+', shape=(slots,))
+            self._rings = rings
+        return self._rings
+
+    def record(self, timestamp: float, values: Dict[str, float]):
+        """Add one sample to the current bucket of every resolution."""
+        with self._lock:
+            for step, ring in self._open().items():
+                bucket = timestamp // step * step
+                slot = int(timestamp // step) % len(ring)
+                if ring['bucket'][slot] != bucket:
+                    # The slot still holds a bucket from the previous lap
+                    ring[slot] = (bucket, 0) + (0.0,) * len(self.METRICS)
+                ring['count'][slot] += 1
+                for m in self.METRICS:
+                    ring[m][slot] += values.get(m, 0.0)
+
+    def flush(self):
+        with self._lock:
+            if self._rings is not None:
+                for ring in self._rings.values():
+                    ring.flush()
+
+    def close(self):
+        self.flush()
+        self._rings = None
+
+    def pick_resolution(self, start: float, max_points: int = config.METRICS_MAX_POINTS) -> int:
+        """Finest resolution that still covers `start` with at most `max_points` buckets."""
+        now = time.time()
+        for step, slots in self.resolutions:
+            if now - start <= step * slots and (now - start) / step <= max_points:
+                return step
+        return self.resolutions[-1][0]
+
+    def query(self, start: float, end: Optional[float] = None,
+              step: Optional[int] = None) -> Dict[str, Any]:
+        """Per-bucket averages between `start` and `end`.
+
+        Returns {'step': seconds, 'time': array, metric: array}, containing
+        only buckets that received samples.
+        """
+        import numpy as np
+        end = end if end is not None else time.time()
+        step = step or self.pick_resolution(start)
+        ring = self._open()[step]
+
+        first = max(start // step, end // step - len(ring) + 1)
+        buckets = np.arange(first, end // step + 1) * step
+        rows = ring[(buckets // step).astype(np.int64) % len(ring)]
+        valid = (rows['bucket'] == buckets) & (rows['count'] > 0)
+        rows = rows[valid]
+
+        result = {'step': step, 'time': rows['bucket']}
+        for m in self.METRICS:
+            result[m] = rows[m] / rows['count']
+        return result
+
+    def summary(self, seconds: float) -> Optional[Dict[str, Dict[str, float]]]:
+        """Mean and peak of each metric over the last `seconds`, or None if empty."""
+        data = self.query(time.time() - seconds)
+        if not len(data['time']):
+            return None
+        return {m: {'mean': float(data[m].mean()), 'max': float(data[m].max())} for m in self.METRICS}
+
+    def hourly_profile(self, days: int = 7) -> Dict[int, Dict[str, float]]:
+        """Average of each metric by hour of day (local time) over recent days."""
+        import numpy as np
+        data = self.query(time.time() - days * 86400, step=3600)
+        if not len(data['time']):
+            return {}
+        hours = np.array([time.localtime(t).tm_hour for t in data['time']])
+        profile = {}
+        for hour in np.unique(hours):
+            mask = hours == hour
+            profile[int(hour)] = {m: float(data[m][mask].mean()) for m in self.METRICS}
+        return profile
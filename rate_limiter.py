@@ -0,0 +1,249 @@
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Callable, Awaitable, TypeVar, Tuple
+import config
+
+T = TypeVar('T')
+
+# Priorities: lower values are served first
+INTERACTIVE = 0
+BULK = 1
+
+class TokenBucket:
+    """Budget refilled continuously at `per_minute` units per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float, scale: float = 1.0) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate * scale)
+        self.updated = now
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / (self.rate * scale)
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+class _Lane:
+    """Request and token buckets plus the waiting queue of one model."""
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.queue = []  # heap of (priority, sequence)
+
+class RateLimiter:
+    """Client-side scheduler for API calls.
+
+    Each model gets token buckets sized from its requests and tokens per
+    minute (`config.RATE_LIMITS`). Calls wait in a priority queue, so
+    interactive turns go ahead of bulk work such as ingestion. Failed calls
+    that are worth retrying (rate limits, timeouts, server errors) are
+    retried with jittered exponential backoff, or after the server's
+    Retry-After. A rate-limit response also pauses all callers and slows
+    the buckets down, which then recover gradually on success.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]] = config.RATE_LIMITS,
+                 max_retries: int = config.API_MAX_RETRIES,
+                 base_delay: float = config.API_RETRY_BASE_DELAY,
+                 max_delay: float = config.API_RETRY_MAX_DELAY):
+        self.limits = limits
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.scale = 1.0
+        self._lanes: Dict[str, _Lane] = {}
+        self._paused_until = 0.0
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self.stats = {'requests': 0, 'throttled': 0, 'throttle_wait_s': 0.0, 'retries': 0,
+                      'rate_limited': 0, 'failures': 0, 'max_queue_depth': 0}
+
+    def _lane(self, model: str) -> _Lane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            rpm, tpm = self.limits.get(model, self.limits['default'])
+            lane = self._lanes[model] = _Lane(rpm, tpm)
+        return lane
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(lane.queue) for lane in self._lanes.values())
+
+    def _enqueue(self, model: str, level: Optional[int]) -> Tuple[_Lane, tuple]:
+        lane = self._lane(model)
+        ticket = (INTERACTIVE if level is None else level, next(self._sequence))
+        heapq.heappush(lane.queue, ticket)
+        self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self.queue_depth)
+        return lane, ticket
+
+    def _dequeue(self, lane: _Lane, ticket: tuple):
+        """Drop a ticket that gave up waiting."""
+        if ticket in lane.queue:
+            lane.queue.remove(ticket)
+            heapq.heapify(lane.queue)
+            self._cond.notify_all()
+
+    def _try_acquire(self, lane: _Lane, ticket: tuple, tokens: int) -> Optional[float]:
+        """Take budget for the ticket at the head of the queue.
+
+        Returns 0 on success, the seconds to wait if the ticket is next but
+        the budget is short, or None if other tickets are ahead of it.
+        """
+        if lane.queue[0] != ticket:
+            return None
+        now = time.monotonic()
+        wait = max(self._paused_until - now,
+                   lane.requests.wait_time(1, now, self.scale),
+                   lane.tokens.wait_time(tokens, now, self.scale))
+        if wait > 0:
+            return wait
+        lane.requests.take(1)
+        lane.tokens.take(tokens)
+        heapq.heappop(lane.queue)
+        self.stats['requests'] += 1
+        self._cond.notify_all()
+        return 0.0
+
+    def _record_wait(self, waited: float):
+        if waited > 0.001:
+            self.stats['throttled'] += 1
+            self.stats['throttle_wait_s'] += waited
+
+    def acquire(self, model: str, tokens: int, level: Optional[int] = None):
+        """Block until a request of `tokens` tokens may be sent."""
+        start = time.monotonic()
+        with self._cond:
+            lane, ticket = self._enqueue(model, level)
+            try:
+                while True:
+                    wait = self._try_acquire(lane, ticket, tokens)
+                    if wait == 0:
+                        break
+                    # Re-check periodically: async callers don't notify the condition while waiting
+                    self._cond.wait(min(wait, 0.05) if wait is not None else 0.05)
+            except BaseException:
+                self._dequeue(lane, ticket)
+                raise
+            self._record_wait(time.monotonic() - start)
+
+    async def acquire_async(self, model: str, tokens: int, level: Optional[int] = None):
+        """Wait, without blocking the event loop, until a request may be sent."""
+        start = time.monotonic()
+        with self._cond:
+            lane, ticket = self._enqueue(model, level)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_acquire(lane, ticket, tokens)
+                if wait == 0:
+                    break
+                await asyncio.sleep(min(wait, 0.05) if wait is not None else 0.005)
+        except BaseException:
+            with self._cond:
+                self._dequeue(lane, ticket)
+            raise
+        with self._cond:
+            self._record_wait(time.monotonic() - start)
+
+    @staticmethod
+    def _retryable(error: Exception) -> bool:
+        import openai
+        if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+            return True
+        status = getattr(error, 'status_code', None)
+        return status in (408, 409, 429) or (status is not None and status >= 500)
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        """Delay requested by the server in seconds, if any."""
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        try:
+            if headers.get('retry-after-ms'):
+                return float(headers['retry-after-ms']) / 1000
+            value = headers.get('retry-after')
+            if value:
+                try:
+                    return float(value)
+                except ValueError:
+                    return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+        return None
+
+    def _on_failure(self, error: Exception, attempt: int) -> Optional[float]:
+        """Backoff before the next attempt, or None to give up."""
+        with self._cond:
+            if getattr(error, 'status_code', None) == 429:
+                self.stats['rate_limited'] += 1
+                self.scale = max(0.1, self.scale * 0.7)
+            if attempt >= self.max_retries or not self._retryable(error):
+                self.stats['failures'] += 1
+                return None
+            self.stats['retries'] += 1
+
+            delay = self._retry_after(error)
+            if delay is None:
+                # Exponential backoff with "equal jitter"
+                ceiling = min(self.max_delay, self.base_delay * 2 ** attempt)
+                delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+            else:
+                delay = min(self.max_delay, delay) + random.uniform(0, 0.1 * delay + 0.05)
+            if getattr(error, 'status_code', None) == 429:
+                # Everyone else would hit the same limit
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            return delay
+
+    def _on_success(self):
+        if self.scale < 1.0:
+            with self._cond:
+                self.scale = min(1.0, self.scale + 0.02)
+
+    def call(self, model: str, tokens: int, fn: Callable[[], T], level: Optional[int] = None) -> T:
+        """Run `fn` (one API request) within the limits, retrying transient failures."""
+        for attempt in itertools.count():
+            self.acquire(model, tokens, level)
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._on_failure(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self._on_success()
+            return result
+
+    async def call_async(self, model: str, tokens: int, fn: Callable[[], Awaitable[T]],
+                         level: Optional[int] = None) -> T:
+        """Async counterpart of `call`; `fn` returns a new awaitable per attempt."""
+        for attempt in itertools.count():
+            await self.acquire_async(model, tokens, level)
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self._on_failure(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self._on_success()
+            return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self.stats)
+            stats['queue_depth'] = self.queue_depth
+            stats['scale'] = self.scale
+            stats['throttle_wait_s'] = round(stats['throttle_wait_s'], 3)
+        return stats
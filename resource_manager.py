@@ -1,96 +1,304 @@
-import psutil
 import time
-from collections import deque
-from typing import Dict, List, Any
-import numpy as np
+import heapq
+import threading
+from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
+import config
 import utils
+from forecasting import HoltForecaster, RollingStats, RateConverter
+from metrics_store import MetricsStore
+
+class SampleRing:
+    """Fixed-size ring buffers of timestamped samples.
+
+    Arrays are preallocated once. Appends are serialized by a writer lock;
+    `snapshot()` takes no lock and instead discards any slot a concurrent
+    writer may have overwritten while it was being copied.
+    """
+    
+    def __init__(self, fields: List[str], capacity: int):
+        import numpy as np
+        self.fields = fields
+        self.capacity = capacity
+        self.times = np.zeros(capacity)
+        self.values = {f: np.zeros(capacity) for f in fields}
+        self.count = 0  # samples ever written
+        self._write_lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+    
+    def append(self, timestamp: float, values: Dict[str, float]):
+        """Write one sample, overwriting the oldest when full."""
+        with self._write_lock:
+            slot = self.count % self.capacity
+            self.times[slot] = timestamp
+            for f in self.fields:
+                self.values[f][slot] = values[f]
+            self.count += 1
+    
+    def snapshot(self, last: Optional[int] = None) -> Dict[str, Any]:
+        """Copy of the samples, oldest first: {'time': array, field: array}."""
+        import numpy as np
+        before = self.count
+        times = self.times.copy()
+        values = {f: v.copy() for f, v in self.values.items()}
+        after = self.count
+        
+        # Slots of samples written during the copy (plus one in flight) are unreliable
+        first = max(0, after + 1 - self.capacity)
+        if last is not None:
+            first = max(first, before - last)
+        slots = np.arange(first, before) % self.capacity
+        
+        snap = {'time': times[slots]}
+        for f in self.fields:
+            snap[f] = values[f][slots]
+        return snap
+
+class ProcessTable:
+    """Persistent table of running processes.
+    
+    `psutil.Process` objects are kept between refreshes, so each
+    `cpu_percent()` call measures the CPU used since the previous refresh.
+    Processes seen for the first time report 0% CPU (that call starts the
+    measurement) but are still ranked by memory. Exited PIDs are evicted,
+    and the `top_n` heaviest processes are kept with a heap.
+    """
+    
+    def __init__(self, top_n: int = config.TOP_PROCESSES):
+        self.top_n = top_n
+        self.top: List[Dict[str, Any]] = []
+        self.last_refresh = 0.0
+        self._procs = {}
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._procs)
+    
+    def refresh(self):
+        """Update CPU deltas for all processes and recompute the top list."""
+        import psutil
+        with self._lock:
+            pids = set(psutil.pids())
+            for pid in set(self._procs) - pids:
+                del self._procs[pid]
+            
+            rows = []
+            for pid in pids:
+                proc = self._procs.get(pid)
+                try:
+                    if proc is None:
+                        proc = psutil.Process(pid)
+                        self._procs[pid] = proc
+                    with proc.oneshot():
+                        row = {
+                            'pid': pid,
+                            'name': proc.name(),
+                            'cpu_percent': proc.cpu_percent(interval=None),  # 0.0 for a new process
+                            'memory_percent': proc.memory_percent()
+                        }
+                except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                    self._procs.pop(pid, None)
+                    continue
+                except psutil.AccessDenied:
+                    continue
+                if row['cpu_percent'] > 1 or row['memory_percent'] > 1:
+                    rows.append(row)
+            
+            # Replace the list in one assignment so readers never see a partial one
+            self.top = heapq.nlargest(self.top_n, rows, key=lambda x: x['cpu_percent'] + x['memory_percent'])
+            self.last_refresh = time.time()
 
 class PredictiveResourceManager:
     """Manages and predicts system resource usage."""
     
-    def __init__(self):
-        self.history = {
-            'cpu': deque(maxlen=100),
-            'memory': deque(maxlen=100),
-            'disk_io': deque(maxlen=100)
-        }
+    RESOURCES = ('cpu', 'memory', 'disk_io')
+    
+    def __init__(self, interval: float = config.RESOURCE_CHECK_INTERVAL):
+        self.interval = interval
+        self.history = SampleRing(list(self.RESOURCES), config.RESOURCE_HISTORY_SIZE)
         self.patterns = {}
+        self._patterns_time = 0.0
+        self.metrics = MetricsStore()
         self.last_check = time.time()
+        self._sampler = None
+        self._stop = threading.Event()
+        self._cpu_primed = False
+        self.processes = ProcessTable()
+        
+        # Streaming estimators, each updated in O(1) per sample. Disk I/O is
+        # tracked as a MB/s rate derived from the cumulative byte counters.
+        self.forecasters = {r: HoltForecaster() for r in self.RESOURCES}
+        self.baselines = {r: RollingStats() for r in self.RESOURCES}
+        self.latest = {r: 0.0 for r in self.RESOURCES}
+        self.zscores = {r: 0.0 for r in self.RESOURCES}
+        self._disk_rate = RateConverter()
+        self._estimator_lock = threading.Lock()
+        self._snapshot = None
+        self._snapshot_time = 0.0
+        self._snapshot_lock = threading.Lock()
     
-    def update(self):
-        """Update resource measurements."""
+    @property
+    def running(self) -> bool:
+        """Whether the background sampler is collecting measurements."""
+        return self._sampler is not None and self._sampler.is_alive()
+    
+    def start(self):
+        """Start sampling every `interval` seconds on a daemon thread."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name="resource-sampler", daemon=True)
+        self._sampler.start()
+    
+    def stop(self):
+        """Stop the background sampler."""
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=self.interval + 1)
+            self._sampler = None
+        self.metrics.flush()
+    
+    def _sample_loop(self):
+        import psutil
+        next_run = time.monotonic()
+        if not self._cpu_primed:
+            psutil.cpu_percent(interval=None)  # prime the CPU counter
+            self._cpu_primed = True
+            # A reading right after priming covers no time and is always 0
+            next_run += self.interval
+        while not self._stop.wait(max(0.0, next_run - time.monotonic())):
+            try:
+                # CPU is averaged over the time since the previous sample
+                self._record(psutil.cpu_percent(interval=None))
+                self.processes.refresh()
+                if time.time() - self._patterns_time > 3600:
+                    self.learn_patterns()
+            except Exception as e:
+                print(utils.format_error(f"Resource sampling failed: {e}"))
+            
+            # Fixed cadence, independent of how long a sample takes
+            next_run += self.interval
+    
+    def _record(self, cpu_percent: float):
+        """Store one measurement."""
+        import psutil
         current_time = time.time()
-        
-        # Collect metrics
-        cpu_percent = psutil.cpu_percent(interval=0.1)
         memory = psutil.virtual_memory()
         disk_io = psutil.disk_io_counters()
         
-        # Store measurements
-        self.history['cpu'].append({
-            'time': current_time,
-            'value': cpu_percent
-        })
-        self.history['memory'].append({
-            'time': current_time,
-            'value': memory.percent
-        })
-        self.history['disk_io'].append({
-            'time': current_time,
-            'read': disk_io.read_bytes,
-            'write': disk_io.write_bytes
-        })
-        
+        sample = {
+            'cpu': cpu_percent,
+            'memory': memory.percent,
+            'disk_read': disk_io.read_bytes if disk_io else 0,
+            'disk_write': disk_io.write_bytes if disk_io else 0
+        }
+        values = self.observe(current_time, sample)
+        if len(values) == len(self.RESOURCES):
+            self.history.append(current_time, values)
+            self.metrics.record(current_time, values)
         self.last_check = current_time
     
-    def predict_usage(self, resource: str, seconds_ahead: int = 30) -> float:
-        """Predict resource usage in the future."""
-        if resource not in self.history or len(self.history[resource]) < 5:
-            return 0.0
-        
-        # Simple linear prediction
-        recent = list(self.history[resource])[-10:]
-        if resource == 'disk_io':
-            values = [(r['read'] + r['write']) / 1024 / 1024 for r in recent]
-        else:
-            values = [r['value'] for r in recent]
+    def observe(self, timestamp: float, sample: Dict[str, float]) -> Dict[str, float]:
+        """Feed one sample to the forecasters and anomaly baselines.
         
-        if len(values) < 2:
-            return values[-1] if values else 0.0
+        Returns the derived values; disk_io is missing until a rate is known.
+        """
+        with self._estimator_lock:
+            values = {'cpu': sample['cpu'], 'memory': sample['memory']}
+            rate = self._disk_rate.update(timestamp, sample['disk_read'] + sample['disk_write'])
+            if rate is not None:
+                values['disk_io'] = rate / 1024 / 1024
+            
+            for resource, value in values.items():
+                # Score against the baseline before the sample joins it
+                self.zscores[resource] = self.baselines[resource].zscore(value)
+                self.baselines[resource].update(value)
+                self.forecasters[resource].update(timestamp, value)
+                self.latest[resource] = value
+            return values
+    
+    def _read_cpu(self) -> float:
+        """CPU percent since the previous reading, without blocking."""
+        import psutil
+        if not self._cpu_primed:
+            # The very first reading needs a short measurement window
+            self._cpu_primed = True
+            return psutil.cpu_percent(interval=0.1)
+        return psutil.cpu_percent(interval=None)
+    
+    def update(self):
+        """Update resource measurements."""
+        # Collect metrics
+        self._record(self._read_cpu())
+    
+    def learn_patterns(self):
+        """Rebuild the hour-of-day usage profile from the hourly metrics."""
+        self.patterns['hourly'] = self.metrics.hourly_profile()
+        self._patterns_time = time.time()
+    
+    def usage_history(self, seconds: float) -> Optional[Dict[str, Dict[str, float]]]:
+        """Mean and peak usage over the last `seconds`.
         
-        # Calculate trend
-        x = np.arange(len(values))
-        y = np.array(values)
+        Windows the in-memory ring still covers are summarized from a
+        lock-free snapshot of it; longer ones from the persistent metrics.
+        """
+        since = time.time() - seconds
+        recent = self.history.snapshot()
+        if len(recent['time']) and recent['time'][0] <= since:
+            mask = recent['time'] >= since
+            if mask.any():
+                return {r: {'mean': float(recent[r][mask].mean()), 'max': float(recent[r][mask].max())}
+                        for r in self.RESOURCES}
+        return self.metrics.summary(seconds)
+    
+    def predict_usage(self, resource: str, seconds_ahead: int = 30) -> float:
+        """Predict resource usage in the future.
         
-        # Simple linear regression
-        A = np.vstack([x, np.ones(len(x))]).T
-        m, c = np.linalg.lstsq(A, y, rcond=None)[0]
+        CPU and memory are percentages; disk_io is a MB/s rate.
+        """
+        if resource not in self.forecasters or self.forecasters[resource].count < 5:
+            return 0.0
         
-        # Predict
-        future_x = len(values) + (seconds_ahead / 5)  # Assuming 5-second intervals
-        prediction = m * future_x + c
+        # Holt forecast from the time of the last sample
+        forecaster = self.forecasters[resource]
+        prediction = forecaster.forecast(time.time() - forecaster.last_time + seconds_ahead)
         
         # Bound prediction
+        if resource == 'disk_io':
+            return max(0.0, prediction)
         return max(0, min(100, prediction))
     
-    def get_current_stats(self) -> Dict[str, Any]:
-        """Get current resource statistics."""
-        cpu = psutil.cpu_percent(interval=0.1)
+    def get_current_stats(self, max_age: float = config.SNAPSHOT_TTL) -> Dict[str, Any]:
+        """Get current resource statistics.
+        
+        The result is a snapshot shared by all callers for `max_age`
+        seconds, so one request samples the system at most once.
+        """
+        with self._snapshot_lock:
+            if self._snapshot is None or time.monotonic() - self._snapshot_time > max_age:
+                self._snapshot = self._take_snapshot()
+                self._snapshot_time = time.monotonic()
+            return self._snapshot
+    
+    def _latest_cpu(self) -> float:
+        """Most recent CPU reading, reusing the sampler's when it is fresh."""
+        if self.forecasters['cpu'].count and time.time() - self.last_check <= 2 * self.interval:
+            return self.latest['cpu']
+        return self._read_cpu()
+    
+    def _take_snapshot(self) -> Dict[str, Any]:
+        """Sample the system once."""
+        import psutil
+        cpu = self._latest_cpu()
         memory = psutil.virtual_memory()
         disk = psutil.disk_usage('/')
         
-        # Get top processes
-        processes = []
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-            try:
-                pinfo = proc.info
-                if pinfo['cpu_percent'] > 1 or pinfo['memory_percent'] > 1:
-                    processes.append(pinfo)
-            except:
-                pass
-        
-        processes.sort(key=lambda x: x['cpu_percent'] + x['memory_percent'], reverse=True)
+        # Top processes come from the persistent table, which the background
+        # sampler refreshes; refresh here only when it is stale
+        if time.time() - self.processes.last_refresh > self.interval:
+            self.processes.refresh()
         
         return {
             'cpu': {
@@ -106,16 +314,23 @@ class PredictiveResourceManager:
             },
             'disk': {
                 'used_percent': disk.percent,
-                'free_gb': disk.free / (1024**3)
+                'free_gb': disk.free / (1024**3),
+                'io_mb_s': self.latest['disk_io'],
+                'predicted_io_30s': self.predict_usage('disk_io', 30)
             },
-            'top_processes': processes[:5]
+            'top_processes': self.processes.top
         }
     
-    def detect_anomalies(self) -> List[str]:
-        """Detect resource usage anomalies."""
+    def detect_anomalies(self, stats: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Detect resource usage anomalies.
+        
+        Pass the result of `get_current_stats()` as `stats` to avoid
+        another lookup.
+        """
         anomalies = []
         
-        stats = self.get_current_stats()
+        if stats is None:
+            stats = self.get_current_stats()
         
         # High CPU usage
         if stats['cpu']['current'] > 80:
@@ -132,4 +347,15 @@ class PredictiveResourceManager:
         if stats['memory']['predicted_30s'] > 90:
             anomalies.append("Memory usage likely to spike in next 30 seconds")
         
+        # Unusual relative to the recent baseline
+        labels = {'cpu': "CPU usage", 'memory': "Memory usage", 'disk_io': "Disk I/O"}
+        units = {'cpu': "%", 'memory': "%", 'disk_io': " MB/s"}
+        for resource, z in self.zscores.items():
+            if len(self.baselines[resource]) >= 10 and abs(z) > config.ANOMALY_ZSCORE:
+                direction = "high" if z > 0 else "low"
+                anomalies.append(
+                    f"{labels[resource]} unusually {direction}: "
+                    f"{self.latest[resource]:.1f}{units[resource]} ({z:+.1f} standard deviations from recent baseline)"
+                )
+        
         return anomalies
\ No newline at end of file
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional, Any
+import config
+
+class ResponseCache:
+    """Cache of chat completions keyed by (model, temperature, messages hash).
+
+    Entries expire after `ttl` seconds. The in-memory tier is an LRU bounded
+    to `max_entries`; an optional SQLite tier at `path` survives restarts.
+    It is pruned on every put: expired rows are deleted, then the oldest
+    rows beyond `max_disk_entries`.
+    Callers opt in per request, which suits deterministic prompts such as
+    command classification.
+    """
+
+    def __init__(self, path: Optional[str] = config.RESPONSE_CACHE_PATH,
+                 max_entries: int = config.RESPONSE_CACHE_SIZE,
+                 ttl: float = config.RESPONSE_CACHE_TTL,
+                 max_disk_entries: int = config.RESPONSE_CACHE_DISK_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._db = None
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0,
+                      'disk_evictions': 0}
+
+    @staticmethod
+    def key(model: str, temperature: float, messages: List[Dict[str, str]]) -> str:
+        payload = json.dumps([model, temperature, messages], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Open the disk tier on first use."""
+        if self._db is None and self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+            self._db.commit()
+        return self._db
+
+    def _remember(self, key: str, response: str, created: float):
+        """Insert into the memory tier, evicting the least recently used."""
+        self._memory[key] = (response, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def get(self, model: str, temperature: float, messages: List[Dict[str, str]]) -> Optional[str]:
+        """Look up a cached, unexpired response."""
+        key = self.key(model, temperature, messages)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            from_disk = False
+            if entry is None:
+                db = self._connect()
+                if db is not None:
+                    entry = db.execute(
+                        "SELECT response, created FROM responses WHERE key = ?", (key,)
+                    ).fetchone()
+                    from_disk = entry is not None
+
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+
+            response, created = entry
+            if now - created > self.ttl:
+                self._memory.pop(key, None)
+                if from_disk:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+
+            if from_disk:
+                self._remember(key, response, created)
+                self.stats['disk_hits'] += 1
+            else:
+                self._memory.move_to_end(key)
+                self.stats['hits'] += 1
+            return response
+
+    def put(self, model: str, temperature: float, messages: List[Dict[str, str]], response: str):
+        """Store a response in both tiers."""
+        key = self.key(model, temperature, messages)
+        created = time.time()
+        with self._lock:
+            self._remember(key, response, created)
+            db = self._connect()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created) VALUES (?, ?, ?)",
+                    (key, response, created)
+                )
+                self._prune(db, created)
+                db.commit()
+
+    def _prune(self, db: sqlite3.Connection, now: float):
+        """Delete expired rows, then the oldest beyond `max_disk_entries` (both use the index)."""
+        expired = db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,)).rowcount
+        overflow = db.execute(
+            "DELETE FROM responses WHERE created <= ("
+            "SELECT created FROM responses ORDER BY created DESC LIMIT 1 OFFSET ?)",
+            (self.max_disk_entries,)
+        ).rowcount
+        self.stats['disk_evictions'] += expired + overflow
+
+    def hit_rate(self) -> float:
+        lookups = self.stats['hits'] + self.stats['disk_hits'] + self.stats['misses']
+        return (self.stats['hits'] + self.stats['disk_hits']) / lookups if lookups else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats, size=len(self._memory), hit_rate=self.hit_rate())
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
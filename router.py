@@ -0,0 +1,168 @@
+import time
+import asyncio
+from typing import Dict, List, Callable, Optional, Tuple, Any, Awaitable
+import config
+import utils
+
+# Labelled examples for the top-level agent routing
+ROUTING_EXAMPLES = {
+    "FILE": [
+        "Create a document about machine learning basics",
+        "Write a note about my project ideas",
+        "Find all documents related to neural networks",
+        "Search my notes for python",
+        "Show me recent documents",
+        "List my files",
+        "Help me organize my files",
+        "Create a Python script for data analysis",
+    ],
+    "SYSTEM": [
+        "What's using the most resources?",
+        "Analyze my system performance",
+        "Show me resource usage patterns",
+        "What processes are running?",
+        "What's my current memory usage?",
+        "How much CPU am I using right now?",
+        "Predict CPU usage for the next minute",
+        "Is my disk getting full?",
+    ],
+    "GENERAL": [
+        "Remember that I prefer markdown format",
+        "What do you remember about me?",
+        "Help me plan my coding tasks",
+        "Summarize our conversation",
+        "What is the capital of France?",
+        "Tell me a joke",
+        "Explain how recursion works",
+        "Hello, how are you?",
+    ],
+}
+
+# Labelled examples for FileManagementAgent actions
+FILE_ACTION_EXAMPLES = {
+    "CREATE": [
+        "Create a document about machine learning basics",
+        "Write a note about my project ideas",
+        "Make a new file with my shopping list",
+        "Draft a report on quarterly results",
+    ],
+    "SEARCH": [
+        "Find all documents related to neural networks",
+        "Search my notes for python",
+        "Which documents mention the budget?",
+        "Look for files about travel",
+    ],
+    "LIST": [
+        "Show me recent documents",
+        "List my files",
+        "What documents did I open lately?",
+        "Show my latest notes",
+    ],
+    "ORGANIZE": [
+        "Help me organize my files",
+        "How should I structure my research papers?",
+        "Suggest a folder layout for my notes",
+        "Clean up my documents",
+    ],
+}
+
+class CommandRouter:
+    """Nearest-centroid command classifier over cached embeddings.
+
+    Each label's centroid is the normalized mean embedding of its examples.
+    Commands whose best and second-best label scores are closer than
+    `min_margin` are considered ambiguous and sent to the LLM fallback.
+    """
+
+    def __init__(self, examples: Dict[str, List[str]],
+                 min_margin: float = config.ROUTER_MIN_MARGIN):
+        self.examples = examples
+        self.labels = list(examples)
+        self.min_margin = min_margin
+        self._centroids = None
+        self.stats = {'routed': 0, 'fallbacks': 0, 'total_ms': 0.0}
+
+    def _ensure_centroids(self):
+        """Embed the examples on first use (cached after the first run)."""
+        if self._centroids is None:
+            import numpy as np
+            centroids = []
+            for label in self.labels:
+                vectors = utils.get_embeddings(self.examples[label])
+                mean = np.mean(np.asarray(vectors, dtype=np.float32), axis=0)
+                centroids.append(mean / np.linalg.norm(mean))
+            self._centroids = np.vstack(centroids)
+
+    def _score(self, embedding: List[float]) -> Tuple[str, float]:
+        """Best label for an embedding and its margin over the runner-up."""
+        import numpy as np
+        q = np.asarray(embedding, dtype=np.float32)
+        scores = self._centroids @ (q / np.linalg.norm(q))
+        order = np.argsort(-scores)
+        margin = float(scores[order[0]] - scores[order[1]]) if len(order) > 1 else 1.0
+        return self.labels[order[0]], margin
+
+    def classify(self, command: str) -> Tuple[str, float]:
+        """Return (label, margin). Embedding API errors are raised."""
+        self._ensure_centroids()
+        return self._score(utils.get_embedding(command))
+
+    async def classify_async(self, command: str,
+                             embedding: Optional[Awaitable[List[float]]] = None) -> Tuple[str, float]:
+        """Async classify; `embedding` may be an already running embedding task."""
+        if self._centroids is None:
+            await asyncio.to_thread(self._ensure_centroids)
+        if embedding is None:
+            embedding = utils.get_embedding_async(command)
+        return self._score(await embedding)
+
+    def parse_label(self, text: str) -> str:
+        """Map a free-form LLM answer to a label (the last label is the default)."""
+        text = text.strip().upper()
+        for label in self.labels[:-1]:
+            if label in text:
+                return label
+        return self.labels[-1]
+
+    def route(self, command: str, fallback: Callable[[], str]) -> str:
+        """Classify locally, asking the LLM via `fallback` when unsure or
+        when the embeddings API fails."""
+        start = time.perf_counter()
+        try:
+            label, margin = self.classify(command)
+        except Exception as e:
+            label, margin = self._unavailable(e)
+        if label is None or margin < self.min_margin:
+            label = self.parse_label(fallback())
+            self.stats['fallbacks'] += 1
+        self.stats['routed'] += 1
+        self.stats['total_ms'] += (time.perf_counter() - start) * 1000
+        return label
+
+    async def route_async(self, command: str, fallback: Callable[[], Awaitable[str]],
+                          embedding: Optional[Awaitable[List[float]]] = None) -> str:
+        """Async route; `fallback` returns an awaitable LLM answer."""
+        start = time.perf_counter()
+        try:
+            label, margin = await self.classify_async(command, embedding)
+        except Exception as e:
+            label, margin = self._unavailable(e)
+        if label is None or margin < self.min_margin:
+            label = self.parse_label(await fallback())
+            self.stats['fallbacks'] += 1
+        self.stats['routed'] += 1
+        self.stats['total_ms'] += (time.perf_counter() - start) * 1000
+        return label
+
+    @staticmethod
+    def _unavailable(error: Exception) -> Tuple[None, float]:
+        print(utils.format_error(f"Local routing failed, asking the LLM: {str(error)}"))
+        return None, 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        routed = self.stats['routed']
+        return dict(
+            self.stats,
+            fallback_rate=self.stats['fallbacks'] / routed if routed else 0.0,
+            avg_ms=self.stats['total_ms'] / routed if routed else 0.0
+        )
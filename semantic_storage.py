@@ -1,52 +1,130 @@
 import os
 import json
-from typing import List, Dict, Any, Optional
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import List, Dict, Any, Optional, Iterable, Callable, Tuple, Union
 from datetime import datetime
 import utils
 import config
+from metadata_store import MetadataStore
+from sqlite_metadata_store import SQLiteMetadataStore
+from lexical_index import LexicalIndex, tokenize, reciprocal_rank_fusion
+from rate_limiter import BULK
 
 class SemanticFileSystem:
-    """A simple semantic file system using embeddings."""
+    """A simple semantic file system using embeddings.
+    
+    Safe to share between threads: reads and writes of the metadata, vector
+    store and indexes are serialized by a re-entrant lock, while embedding
+    API calls happen outside it so they can overlap.
+    """
     
     def __init__(self):
         self.storage_path = config.STORAGE_PATH
         self.metadata_file = os.path.join(self.storage_path, "metadata.json")
+        self.journal_file = os.path.join(self.storage_path, "metadata.journal")
         self.embeddings_file = os.path.join(self.storage_path, "embeddings.json")
         self._ensure_storage()
         self.metadata = self._load_metadata()
-        self.embeddings = self._load_embeddings()
+        self._vectors = None
+        self._ann = None
+        self._lexical = None
+        self._id_base = None
+        self._id_seq = 0
+        self._lock = threading.RLock()
     
     def _ensure_storage(self):
         """Ensure storage directory exists."""
         os.makedirs(self.storage_path, exist_ok=True)
     
-    def _load_metadata(self) -> Dict[str, Any]:
-        """Load file metadata."""
-        return utils.load_json(self.metadata_file)
+    def _load_metadata(self) -> Union[MetadataStore, SQLiteMetadataStore]:
+        """Open the configured metadata backend."""
+        if config.METADATA_BACKEND == 'sqlite':
+            store = SQLiteMetadataStore(config.METADATA_DB)
+            self._migrate_metadata(store)
+            return store
+        return MetadataStore(self.metadata_file, self.journal_file)
     
-    def _load_embeddings(self) -> Dict[str, List[float]]:
-        """Load file embeddings."""
-        return utils.load_json(self.embeddings_file)
+    def _migrate_metadata(self, store: SQLiteMetadataStore):
+        """Move JSON metadata (snapshot plus journal) into the SQLite store."""
+        if not (os.path.exists(self.metadata_file) or os.path.exists(self.journal_file)):
+            return
+        legacy = MetadataStore(self.metadata_file, self.journal_file)
+        count = store.import_store(legacy)
+        legacy.journal.close()
+        for path in (self.metadata_file, self.journal_file):
+            if os.path.exists(path):
+                os.replace(path, path + ".migrated")
+        print(utils.format_system_message(f"Migrated {count} file records to SQLite metadata store."))
     
-    def _save_metadata(self):
-        """Save file metadata."""
-        utils.save_json(self.metadata, self.metadata_file)
+    @property
+    def vectors(self):
+        """Embedding store, opened on first use (NumPy is imported lazily)."""
+        with self._lock:
+            if self._vectors is None:
+                from vector_store import VectorStore
+                self._vectors = VectorStore(os.path.join(self.storage_path, "vectors"))
+                self._migrate_embeddings()
+            return self._vectors
     
-    def _save_embeddings(self):
-        """Save file embeddings."""
-        utils.save_json(self.embeddings, self.embeddings_file)
+    @property
+    def ann(self):
+        """Approximate nearest-neighbour index over the embedding store."""
+        with self._lock:
+            if self._ann is None:
+                from ann_index import IVFIndex
+                self._ann = IVFIndex(os.path.join(self.storage_path, "ivf"), self.vectors)
+            return self._ann
     
-    def create_file(self, content: str, context: str = "") -> str:
-        """Create a new file with semantic understanding."""
-        file_id = f"file_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    @property
+    def lexical(self) -> LexicalIndex:
+        """BM25 keyword index, built from the metadata on first use."""
+        with self._lock:
+            if self._lexical is None:
+                index = LexicalIndex()
+                for record in self.metadata.values():
+                    index.add(record['id'], self._full_text(record['content'], record.get('context', '')),
+                              record.get('tags', []))
+                self._lexical = index
+            return self._lexical
+    
+    def _index_text(self, record: Dict[str, Any]):
+        """Keep the keyword index in step with a created or updated record."""
+        # The SQLite backend maintains its own full-text index
+        if self._lexical is not None:
+            self._lexical.add(record['id'], self._full_text(record['content'], record.get('context', '')),
+                              record.get('tags', []))
+    
+    def _migrate_embeddings(self):
+        """Move a legacy embeddings.json into the binary vector store."""
+        if os.path.exists(self.embeddings_file):
+            count = self._vectors.import_json(self.embeddings_file)
+            print(utils.format_system_message(f"Migrated {count} embeddings to binary vector store."))
+    
+    def _new_file_id(self) -> str:
+        """Generate a unique, time-based file id.
         
-        # Generate embedding from content and context
-        full_text = f"{context}\n\n{content}" if context else content
-        embedding = utils.get_embedding(full_text)
+        Call with `metadata.lock` held, after `metadata.refresh()`, so ids
+        taken by other processes sharing the store are seen.
+        """
+        base = f"file_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        if base != self._id_base:
+            self._id_base, self._id_seq = base, 0
         
-        # Store metadata
-        self.metadata[file_id] = {
-            "id": file_id,
+        # Several files created within the same second get a suffix
+        while True:
+            file_id = base if self._id_seq == 0 else f"{base}_{self._id_seq}"
+            self._id_seq += 1
+            if file_id not in self.metadata:
+                return file_id
+    
+    def _new_record(self, content: str, context: str) -> Dict[str, Any]:
+        """Build the metadata record for a new file."""
+        return {
+            "id": self._new_file_id(),
             "content": content,
             "context": context,
             "created": utils.timestamp(),
@@ -54,15 +132,116 @@ class SemanticFileSystem:
             "access_count": 0,
             "tags": self._extract_tags(content)
         }
+    
+    @staticmethod
+    def _full_text(content: str, context: str) -> str:
+        """Text that gets embedded for a file."""
+        return f"{context}\n\n{content}" if context else content
+    
+    def create_file(self, content: str, context: str = "") -> str:
+        """Create a new file with semantic understanding."""
+        # Generate embedding from content and context
+        embedding = utils.get_embedding(self._full_text(content, context))
+        
+        with self._lock:
+            # Store metadata (one journal append)
+            with self.metadata.lock:
+                self.metadata.refresh()
+                record = self._new_record(content, context)
+                self.metadata.create(record)
+            self._index_text(record)
+            
+            # Store embedding (appends a single row)
+            self.vectors.add(record["id"], embedding)
+            self.ann.update()
+        
+        return record["id"]
+    
+    def create_files(self, documents: Iterable[Union[str, Tuple[str, str], Dict[str, str]]],
+                     batch_size: int = config.INGEST_BATCH_SIZE,
+                     max_workers: int = config.INGEST_WORKERS,
+                     progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[str]:
+        """Bulk-create files.
+        
+        Documents may be strings, (content, context) tuples or dicts with
+        'content' and optional 'context' keys. Texts are embedded in batches
+        of `batch_size` on a pool of `max_workers` threads, and each batch is
+        committed with one metadata write and one vector append. Embedding
+        requests run at bulk priority, so interactive API calls go first.
+        `progress` is called after every batch with counts and throughput.
+        """
+        total = len(documents) if hasattr(documents, '__len__') else None
+        docs = iter(documents)
+        file_ids = []
+        start = time.time()
+        
+        def normalize(doc) -> Tuple[str, str]:
+            if isinstance(doc, str):
+                return doc, ""
+            if isinstance(doc, dict):
+                return doc["content"], doc.get("context", "")
+            return doc[0], doc[1] if len(doc) > 1 else ""
         
-        # Store embedding
-        self.embeddings[file_id] = embedding
+        def commit(batch: List[Tuple[str, str]], embeddings: List[List[float]]):
+            with self._lock:
+                with self.metadata.lock:
+                    self.metadata.refresh()
+                    records = [self._new_record(content, context) for content, context in batch]
+                    self.metadata.create_many(records)
+                for record in records:
+                    self._index_text(record)
+                self.vectors.add_many((r["id"], e) for r, e in zip(records, embeddings))
+                self.ann.update()
+            file_ids.extend(r["id"] for r in records)
+            
+            if progress:
+                elapsed = time.time() - start
+                progress({
+                    "done": len(file_ids),
+                    "total": total,
+                    "elapsed": elapsed,
+                    "docs_per_sec": len(file_ids) / elapsed if elapsed > 0 else 0.0
+                })
         
-        # Save to disk
-        self._save_metadata()
-        self._save_embeddings()
+        # Keep a bounded window of in-flight batches, committed in order
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = deque()
+            while True:
+                batch = [normalize(d) for d in islice(docs, batch_size)]
+                if batch:
+                    texts = [self._full_text(content, context) for content, context in batch]
+                    pending.append((batch, pool.submit(utils.get_embeddings, texts, True, BULK)))
+                if pending and (not batch or len(pending) >= max_workers * 2):
+                    done_batch, future = pending.popleft()
+                    commit(done_batch, future.result())
+                elif not batch:
+                    break
         
-        return file_id
+        return file_ids
+    
+    def update_file(self, file_id: str, content: str, context: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Replace the content of an existing file and refresh its embedding."""
+        with self._lock:
+            record = self.metadata.get(file_id)
+        if record is None:
+            return None
+        
+        if context is None:
+            context = record.get('context', '')
+        embedding = utils.get_embedding(self._full_text(content, context))
+        
+        with self._lock:
+            self.vectors.add(file_id, embedding)
+            self.ann.update()
+            
+            record = self.metadata.modify(file_id, {
+                "content": content,
+                "context": context,
+                "modified": utils.timestamp(),
+                "tags": self._extract_tags(content)
+            })
+            self._index_text(record)
+        return record
     
     def _extract_tags(self, content: str) -> List[str]:
         """Extract semantic tags from content."""
@@ -72,47 +251,102 @@ class SemanticFileSystem:
         tags = [w for w in words if len(w) > 4 and w not in common_words]
         return list(set(tags))[:5]
     
-    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Search files using semantic similarity."""
-        if not self.embeddings:
+    def search(self, query: str, limit: int = 5, exact: bool = False,
+               nprobe: Optional[int] = None, mode: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Search files by keywords, semantic similarity, or both.
+        
+        `mode` is 'lexical' (BM25 over content and tags, no API call),
+        'semantic' (embeddings) or 'hybrid' (both rankings fused with
+        reciprocal rank fusion). Hybrid search skips the embedding when the
+        best keyword hit contains every query term. Large stores use the
+        approximate IVF index; `nprobe` trades latency for recall and
+        `exact=True` forces a brute-force scan. If the embedding request
+        fails, hybrid search returns the keyword hits alone.
+        """
+        mode = mode or config.SEARCH_MODE
+        candidates = limit * 2 if mode == 'hybrid' else limit
+        
+        lexical = [] if mode == 'semantic' else self._lexical_search(query, candidates)
+        if mode == 'lexical' or (mode == 'hybrid' and config.LEXICAL_SHORTCUT and lexical
+                                 and self._covers_query(lexical[0][0], query)):
+            return self._results(lexical[:limit], 'score')
+        
+        try:
+            semantic = self._semantic_search(query, candidates, exact, nprobe)
+        except Exception as e:
+            if mode != 'hybrid' or not lexical:
+                raise
+            print(utils.format_error(f"Semantic search failed, showing keyword matches only: {str(e)}"))
+            return self._results(lexical[:limit], 'score')
+        if mode == 'semantic' or not lexical:
+            return self._results(semantic[:limit], 'similarity')
+        if not semantic:
+            return self._results(lexical[:limit], 'score')
+        
+        similarities = dict(semantic)
+        fused = reciprocal_rank_fusion([[i for i, _ in lexical], [i for i, _ in semantic]])
+        results = self._results(fused[:limit], 'score')
+        for result in results:
+            if result['id'] in similarities:
+                result['similarity'] = similarities[result['id']]
+        return results
+    
+    def _lexical_search(self, query: str, limit: int) -> List[Tuple[str, float]]:
+        """Keyword matches as (file_id, BM25 score)."""
+        with self._lock:
+            if isinstance(self.metadata, SQLiteMetadataStore):
+                return [(r['id'], r['score']) for r in self.metadata.search_text(" ".join(tokenize(query)), limit)]
+            return self.lexical.search(query, limit)
+    
+    def _semantic_search(self, query: str, limit: int, exact: bool = False,
+                         nprobe: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Nearest embeddings as (file_id, cosine similarity)."""
+        if not len(self.vectors):
             return []
         
         # Get query embedding
         query_embedding = utils.get_embedding(query)
-        if not query_embedding:
-            return []
-        
-        # Calculate similarities
-        similarities = []
-        for file_id, file_embedding in self.embeddings.items():
-            similarity = utils.cosine_similarity(query_embedding, file_embedding)
-            similarities.append((file_id, similarity))
-        
-        # Sort by similarity
-        similarities.sort(key=lambda x: x[1], reverse=True)
         
-        # Return top results
+        # Score candidate files with one matrix-vector product
+        with self._lock:
+            if exact:
+                return self.vectors.search(query_embedding, limit)
+            return self.ann.search(query_embedding, limit, nprobe)
+    
+    def _covers_query(self, file_id: str, query: str) -> bool:
+        """Whether a file contains every (non-stopword) term of the query."""
+        terms = set(tokenize(query))
+        with self._lock:
+            record = self.metadata.get(file_id)
+        if not terms or record is None:
+            return False
+        text = self._full_text(record['content'], record.get('context', ''))
+        return terms <= set(tokenize(text + " " + " ".join(record.get('tags', []))))
+    
+    def _results(self, scored: List[Tuple[str, float]], key: str) -> List[Dict[str, Any]]:
+        """Records for (file_id, score) pairs, with the score stored under `key`."""
         results = []
-        for file_id, similarity in similarities[:limit]:
-            if file_id in self.metadata:
-                result = self.metadata[file_id].copy()
-                result['similarity'] = similarity
+        for file_id, score in scored:
+            with self._lock:
+                record = self.metadata.get(file_id)
+            if record is not None:
+                result = record.copy()
+                result[key] = score
                 results.append(result)
-        
         return results
     
     def get_file(self, file_id: str) -> Optional[Dict[str, Any]]:
         """Get file by ID."""
-        if file_id in self.metadata:
-            # Update access count
-            self.metadata[file_id]['access_count'] += 1
-            self.metadata[file_id]['last_accessed'] = utils.timestamp()
-            self._save_metadata()
-            return self.metadata[file_id]
-        return None
+        # Update access count (one journal append, no snapshot rewrite)
+        with self._lock:
+            return self.metadata.record_access(file_id)
     
     def get_recent_files(self, limit: int = 5) -> List[Dict[str, Any]]:
         """Get recently accessed files."""
-        files = list(self.metadata.values())
-        files.sort(key=lambda x: x.get('last_accessed', x['created']), reverse=True)
-        return files[:limit]
\ No newline at end of file
+        with self._lock:
+            return self.metadata.recent(limit)
+    
+    def close(self):
+        """Checkpoint metadata and release open files."""
+        with self._lock:
+            self.metadata.close()
\ No newline at end of file
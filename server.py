@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+LLM OS server - serves many users from one process
+
+Each session gets its own conversation context and PersonalAssistant
+memory; the semantic file system, resource manager and OpenAI clients are
+shared. Run `python server.py --help` for options.
+
+    POST   /command        {"command": "...", "session": "optional id"}
+    POST   /sessions       create a session
+    DELETE /sessions/<id>  end a session
+    GET    /health         load and session statistics
+"""
+
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+import config
+import utils
+from agents import AgentCoordinator, PersonalAssistant
+from context_manager import ContextManager
+from semantic_storage import SemanticFileSystem
+from resource_manager import PredictiveResourceManager
+
+MAX_BODY = 1024 * 1024
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable"}
+
+class Overloaded(Exception):
+    """Raised when the command queue is full."""
+
+class Session:
+    """One user's conversation, with its own assistant memory.
+
+    The coordinator (routers, file and system agents) is shared by all
+    sessions; only the assistant and the conversation are per session.
+    """
+
+    def __init__(self, session_id: str, coordinator: AgentCoordinator):
+        self.id = session_id
+        self.coordinator = coordinator
+        self.assistant = PersonalAssistant()
+        self.conversation = ContextManager()
+        self.lock = asyncio.Lock()  # a session's commands run one at a time, in order
+        self.created = utils.timestamp()
+        self.last_used = time.monotonic()
+        self.commands = 0
+
+    async def process(self, command: str) -> Tuple[str, str]:
+        """Route one command with this session's context."""
+        self.conversation.add('user', command, timestamp=utils.timestamp())
+        context = self.conversation.build([f"Current time: {utils.timestamp()}"])
+        agent_name, response = await self.coordinator.route_command_async(command, context, self.assistant)
+        self.conversation.add('assistant', response, agent=agent_name, timestamp=utils.timestamp())
+        self.commands += 1
+        return agent_name, response
+
+class LLMOSServer:
+    """Asyncio HTTP server exposing command processing to many sessions.
+
+    At most `max_concurrent` commands run at once; up to `max_queue` more
+    wait for a slot, and requests beyond that are rejected with 503 so
+    clients back off instead of piling up.
+    """
+
+    def __init__(self, max_concurrent: int = config.SERVER_MAX_CONCURRENT,
+                 max_queue: int = config.SERVER_MAX_QUEUE,
+                 max_sessions: int = config.SERVER_MAX_SESSIONS,
+                 session_ttl: float = config.SERVER_SESSION_TTL):
+        self.fs = SemanticFileSystem()
+        self.rm = PredictiveResourceManager()
+        self.coordinator = AgentCoordinator(fs=self.fs, rm=self.rm)
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.active = 0
+        self.waiting = 0
+        self.stats = {'requests': 0, 'commands': 0, 'rejected': 0, 'errors': 0, 'total_ms': 0.0}
+        self._slots = None
+        self._server = None
+
+    def session(self, session_id: Optional[str] = None) -> Session:
+        """Get a session, creating it if needed."""
+        session_id = session_id or uuid.uuid4().hex
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = Session(session_id, self.coordinator)
+            self.sessions[session_id] = session
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        self.sessions.move_to_end(session_id)
+        session.last_used = time.monotonic()
+        return session
+
+    def _expire_sessions(self):
+        cutoff = time.monotonic() - self.session_ttl
+        for session_id in [s.id for s in self.sessions.values() if s.last_used < cutoff and not s.lock.locked()]:
+            del self.sessions[session_id]
+
+    async def process_command(self, command: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Run a command in a session, waiting for a free slot."""
+        if self.waiting >= self.max_queue:
+            self.stats['rejected'] += 1
+            raise Overloaded()
+
+        session = self.session(session_id)
+        self.waiting += 1
+        queued = True
+        start = time.perf_counter()
+        try:
+            async with session.lock:
+                async with self._slots:
+                    self.waiting -= 1
+                    queued = False
+                    self.active += 1
+                    try:
+                        agent_name, response = await session.process(command)
+                    finally:
+                        self.active -= 1
+        finally:
+            if queued:
+                self.waiting -= 1
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.stats['commands'] += 1
+        self.stats['total_ms'] += latency_ms
+        return {'session': session.id, 'agent': agent_name, 'response': response,
+                'latency_ms': round(latency_ms, 1)}
+
+    def health(self) -> Dict[str, Any]:
+        commands = self.stats['commands']
+        return {
+            'status': 'ok',
+            'sessions': len(self.sessions),
+            'active': self.active,
+            'waiting': self.waiting,
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            **{k: v for k, v in self.stats.items() if k != 'total_ms'},
+            'avg_ms': round(self.stats['total_ms'] / commands, 1) if commands else 0.0,
+            'api': utils.rate_limiter.get_stats()
+        }
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        """Handle one request, returning (status, JSON payload)."""
+        if path == "/health":
+            return (200, self.health()) if method == "GET" else (405, {'error': "use GET"})
+
+        if path == "/sessions":
+            if method != "POST":
+                return 405, {'error': "use POST"}
+            return 201, {'session': self.session().id}
+
+        if path.startswith("/sessions/"):
+            if method != "DELETE":
+                return 405, {'error': "use DELETE"}
+            session = self.sessions.pop(path[len("/sessions/"):], None)
+            if session is None:
+                return 404, {'error': "unknown session"}
+            return 200, {'session': session.id, 'commands': session.commands}
+
+        if path == "/command":
+            if method != "POST":
+                return 405, {'error': "use POST"}
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                return 400, {'error': "invalid JSON"}
+            command = request.get('command') if isinstance(request, dict) else None
+            if not isinstance(command, str) or not command.strip():
+                return 400, {'error': "missing 'command'"}
+            try:
+                return 200, await self.process_command(command.strip(), request.get('session'))
+            except Overloaded:
+                return 503, {'error': "server busy, retry later"}
+            except Exception as e:
+                if getattr(e, 'status_code', None) == 429:
+                    # Upstream rate limit outlasted the client's retries
+                    return 503, {'error': "rate limit reached, retry later"}
+                raise
+
+        return 404, {'error': "not found"}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve HTTP/1.1 requests on one connection (keep-alive supported)."""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                self.stats['requests'] += 1
+                if body is None:
+                    status, payload = 413, {'error': "request body too large"}
+                else:
+                    try:
+                        status, payload = await self.dispatch(method, path.split("?", 1)[0], body)
+                    except Exception as e:
+                        self.stats['errors'] += 1
+                        status, payload = 500, {'error': str(e)}
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and body is not None
+                data = json.dumps(payload, default=str).encode('utf-8')
+                head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                        "Content-Type: application/json",
+                        f"Content-Length: {len(data)}",
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                if status == 503:
+                    head.append("Retry-After: 1")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader):
+        """Parse one request: (method, path, headers, body), body None if too large."""
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        method, path, _ = line.decode('latin-1').split(" ", 2)
+        headers = {}
+        while True:
+            header = await reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = header.decode('latin-1').partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if length > MAX_BODY:
+            return method, path, headers, None
+        body = await reader.readexactly(length) if length else b""
+        return method, path, headers, body
+
+    async def _expiry_loop(self):
+        while True:
+            await asyncio.sleep(60)
+            self._expire_sessions()
+
+    async def serve(self, host: str = config.SERVER_HOST, port: int = config.SERVER_PORT):
+        """Run until cancelled."""
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self.rm.start()
+        self._server = await asyncio.start_server(self._handle, host, port, backlog=1024)
+        expiry = asyncio.create_task(self._expiry_loop())
+        print(utils.format_system_message(f"LLM OS server listening on http://{host}:{port}"), flush=True)
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            expiry.cancel()
+            self.close()
+
+    def close(self):
+        self.rm.stop()
+        self.fs.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM OS multi-session server")
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument("--max-concurrent", type=int, default=config.SERVER_MAX_CONCURRENT,
+                        help="commands processed at the same time")
+    parser.add_argument("--max-queue", type=int, default=config.SERVER_MAX_QUEUE,
+                        help="commands allowed to wait before requests are rejected with 503")
+    args = parser.parse_args()
+
+    if not config.OPENAI_API_KEY:
+        print(utils.format_error("OpenAI API key not found! Set OPENAI_API_KEY environment variable."))
+        sys.exit(1)
+
+    server = LLMOSServer(max_concurrent=args.max_concurrent, max_queue=args.max_queue)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print(utils.format_system_message("Server stopped."))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import Dict, Any, List, Optional, Iterator, Iterable
+import utils
+import config
+from storage import FileLock
+
+class SQLiteMetadataStore:
+    """File metadata and content kept in SQLite.
+
+    Drop-in replacement for `MetadataStore`: the same mapping-like API, but
+    records are read from disk on demand, so memory stays flat as the corpus
+    grows. Recency is indexed, so `recent()` is a LIMIT query, and an FTS5
+    table over content, context and tags backs `search_text()`.
+    """
+
+    COLUMNS = ('id', 'content', 'context', 'created', 'modified', 'last_accessed', 'access_count', 'tags')
+
+    def __init__(self, path: str = config.METADATA_DB):
+        self.path = path
+        self.fts = False
+        self._db = None
+        self._lock = threading.RLock()
+        self.lock = FileLock(f"{path}.lock")  # for callers coordinating with other processes
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database and create the schema on first use."""
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    id TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    context TEXT,
+                    created TEXT NOT NULL,
+                    modified TEXT,
+                    last_accessed TEXT,
+                    access_count INTEGER NOT NULL DEFAULT 0,
+                    tags TEXT,
+                    extra TEXT
+                );
+                CREATE INDEX IF NOT EXISTS files_created ON files(created);
+                CREATE INDEX IF NOT EXISTS files_last_accessed ON files(last_accessed);
+                CREATE INDEX IF NOT EXISTS files_recency ON files(COALESCE(last_accessed, created));
+            """)
+            try:
+                # External-content FTS index, kept in sync by triggers
+                db.executescript("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+                        content, context, tags, content='files', content_rowid='rowid');
+                    CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+                        INSERT INTO files_fts(rowid, content, context, tags)
+                        VALUES (new.rowid, new.content, new.context, new.tags);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+                        INSERT INTO files_fts(files_fts, rowid, content, context, tags)
+                        VALUES ('delete', old.rowid, old.content, old.context, old.tags);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE OF content, context, tags ON files BEGIN
+                        INSERT INTO files_fts(files_fts, rowid, content, context, tags)
+                        VALUES ('delete', old.rowid, old.content, old.context, old.tags);
+                        INSERT INTO files_fts(rowid, content, context, tags)
+                        VALUES (new.rowid, new.content, new.context, new.tags);
+                    END;
+                """)
+                self.fts = True
+            except sqlite3.OperationalError:
+                pass  # SQLite built without FTS5
+            db.commit()
+            self._db = db
+        return self._db
+
+    @classmethod
+    def _to_row(cls, record: Dict[str, Any]) -> tuple:
+        extra = {k: v for k, v in record.items() if k not in cls.COLUMNS}
+        return (
+            record['id'], record.get('content', ''), record.get('context', ''),
+            record.get('created') or utils.timestamp(), record.get('modified'),
+            record.get('last_accessed'), record.get('access_count', 0),
+            json.dumps(record.get('tags', [])),
+            json.dumps(extra, default=str) if extra else None
+        )
+
+    @classmethod
+    def _to_record(cls, row: tuple) -> Dict[str, Any]:
+        record = dict(zip(cls.COLUMNS, row[:-1]))
+        record['tags'] = json.loads(record['tags']) if record['tags'] else []
+        if record['last_accessed'] is None:
+            del record['last_accessed']
+        if row[-1]:
+            record.update(json.loads(row[-1]))
+        return record
+
+    def _select(self, where: str = "", params: tuple = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT {', '.join(self.COLUMNS)}, extra FROM files {where}", params
+            ).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def __contains__(self, file_id: str) -> bool:
+        with self._lock:
+            return self._connect().execute("SELECT 1 FROM files WHERE id = ?", (file_id,)).fetchone() is not None
+
+    def __getitem__(self, file_id: str) -> Dict[str, Any]:
+        record = self.get(file_id)
+        if record is None:
+            raise KeyError(file_id)
+        return record
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            ids = self._connect().execute("SELECT id FROM files ORDER BY rowid").fetchall()
+        return (row[0] for row in ids)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def get(self, file_id: str) -> Optional[Dict[str, Any]]:
+        records = self._select("WHERE id = ?", (file_id,))
+        return records[0] if records else None
+
+    def values(self, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """All records, read in batches by rowid."""
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._connect().execute(
+                    f"SELECT rowid, {', '.join(self.COLUMNS)}, extra FROM files "
+                    f"WHERE rowid > ? ORDER BY rowid LIMIT ?", (last, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            for row in rows:
+                yield self._to_record(row[1:])
+
+    def create(self, record: Dict[str, Any]):
+        """Add a new file record."""
+        self.create_many([record])
+
+    def create_many(self, records: Iterable[Dict[str, Any]]):
+        """Add several file records in one transaction."""
+        columns = self.COLUMNS + ('extra',)
+        # An upsert (not INSERT OR REPLACE) so the FTS update trigger fires
+        updates = ', '.join(f"{c} = excluded.{c}" for c in columns[1:])
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.executemany(
+                    f"INSERT INTO files ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                    f"ON CONFLICT(id) DO UPDATE SET {updates}",
+                    (self._to_row(r) for r in records)
+                )
+
+    def record_access(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Bump the access count of a file and return its record."""
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.execute(
+                    "UPDATE files SET access_count = access_count + 1, last_accessed = ? WHERE id = ?",
+                    (utils.timestamp(), file_id)
+                )
+            return self.get(file_id)
+
+    def modify(self, file_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update fields of a file record."""
+        with self._lock:
+            record = self.get(file_id)
+            if record is None:
+                return None
+            record.update(fields)
+            self.create(record)
+            return record
+
+    def refresh(self):
+        """No-op: records are always read from the database."""
+
+    def recent(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Most recently accessed (or created) records, from the recency index."""
+        return self._select("ORDER BY COALESCE(last_accessed, created) DESC LIMIT ?", (limit,))
+
+    def search_text(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Full-text search ranked by BM25 (empty without FTS5)."""
+        self._connect()
+        terms = [t for t in query.replace('"', ' ').split() if t]
+        if not self.fts or not terms:
+            return []
+        match = " OR ".join(f'"{t}"' for t in terms)
+        columns = ', '.join(f"files.{c}" for c in self.COLUMNS)
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT {columns}, files.extra, bm25(files_fts) FROM files_fts "
+                f"JOIN files ON files.rowid = files_fts.rowid "
+                f"WHERE files_fts MATCH ? ORDER BY bm25(files_fts) LIMIT ?", (match, limit)
+            ).fetchall()
+        results = []
+        for row in rows:
+            record = self._to_record(row[:-1])
+            record['score'] = -row[-1]  # bm25() is lower-is-better
+            results.append(record)
+        return results
+
+    def import_store(self, store) -> int:
+        """Copy every record of another store (e.g. a JSON `MetadataStore`)."""
+        batch = []
+        count = 0
+        for record in store.values():
+            batch.append(record)
+            if len(batch) >= 1000:
+                self.create_many(batch)
+                count += len(batch)
+                batch = []
+        self.create_many(batch)
+        return count + len(batch)
+
+    def checkpoint(self):
+        """Fold the write-ahead log into the database file."""
+        with self._lock:
+            if self._db is not None:
+                self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self.checkpoint()
+                self._db.close()
+                self._db = None
@@ -0,0 +1,175 @@
+import os
+import json
+import threading
+from typing import Any, Callable, Union
+import config
+
+try:
+    import fcntl
+
+    def _lock_fd(fd: int):
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+    def _unlock_fd(fd: int):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def _lock_fd(fd: int):
+        os.lseek(fd, 0, os.SEEK_SET)
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue  # LK_LOCK gives up after about 10 seconds; keep waiting
+
+    def _unlock_fd(fd: int):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+DURABILITY_MODES = ('sync', 'debounced', 'shutdown')
+
+def _sync_dir(directory: str):
+    """Persist a rename in `directory` (not possible, nor needed, on Windows)."""
+    if os.name == 'posix':
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+def atomic_write(path: str, data: Union[str, bytes], durable: bool = True):
+    """Replace `path` with `data` in one step.
+
+    The data is written to a temporary file next to `path` and renamed over
+    it, so readers (and a restart after a crash) see either the old or the
+    new contents, never a partial file. With `durable` the data and the
+    rename are fsynced before returning.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_file, 'wb') as f:
+            f.write(data.encode('utf-8') if isinstance(data, str) else data)
+            f.flush()
+            if durable:
+                os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    if durable:
+        _sync_dir(directory)
+
+def atomic_write_json(path: str, data: Any, durable: bool = True):
+    """Atomically replace `path` with `data` as JSON."""
+    atomic_write(path, json.dumps(data, indent=2, default=str), durable)
+
+class FileLock:
+    """Advisory lock shared between processes, through a lock file.
+
+    Uses flock on POSIX and msvcrt.locking on Windows. It only excludes
+    other processes that take the same lock. Within a process the lock is
+    reentrant and also excludes other threads, so keep one instance per
+    lock file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mutex = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._mutex.acquire()
+        try:
+            if self._depth == 0:
+                if self._fd is None:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                _lock_fd(self._fd)
+        except BaseException:
+            self._mutex.release()
+            raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            _unlock_fd(self._fd)
+        self._mutex.release()
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def close(self):
+        with self._mutex:
+            if self._fd is not None and self._depth == 0:
+                os.close(self._fd)
+                self._fd = None
+
+class Flusher:
+    """Dirty tracking for buffered writes, flushed according to a durability mode.
+
+    - 'sync': `flush` runs on every `mark_dirty`.
+    - 'debounced': a background timer runs `flush` `delay` seconds after
+      the first write of a burst, so the whole burst costs one flush.
+    - 'shutdown': `flush` runs only on `flush()` or `close()`.
+    """
+
+    def __init__(self, flush: Callable[[], None], mode: str = config.DURABILITY,
+                 delay: float = config.FLUSH_DELAY):
+        if mode not in DURABILITY_MODES:
+            raise ValueError(f"unknown durability mode {mode!r}, expected one of {DURABILITY_MODES}")
+        self.mode = mode
+        self.delay = delay
+        self.dirty = False
+        self.flushes = 0
+        self._flush = flush
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def mark_dirty(self):
+        """Note a write, flushing now or scheduling a flush per the mode."""
+        with self._lock:
+            self.dirty = True
+            if self.mode == 'debounced' and self._timer is None:
+                self._timer = threading.Timer(self.delay, self._run)
+                self._timer.daemon = True
+                self._timer.start()
+        if self.mode == 'sync':
+            self.flush()
+
+    def _run(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
+    def flush(self):
+        """Flush now if anything was written since the last flush."""
+        with self._lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+        try:
+            self._flush()
+        except BaseException:
+            with self._lock:
+                self.dirty = True
+            raise
+        self.flushes += 1
+
+    def close(self):
+        """Cancel a scheduled flush and flush pending writes."""
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        self.flush()
@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Keep caches and stores created on import out of the real storage directory
+os.environ.setdefault('LLM_OS_STORAGE', tempfile.mkdtemp(prefix="llm_os_test_"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
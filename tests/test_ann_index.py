@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+
+from ann_index import IVFIndex
+from vector_store import VectorStore
+
+
+def open_index(tmp_path):
+    store = VectorStore(os.path.join(tmp_path, "vectors"), 'float32')
+    return IVFIndex(os.path.join(tmp_path, "ivf"), store, min_train=50, background=False)
+
+
+def add_random(index, rng, count, prefix):
+    index.store.add_many((f"{prefix}{i}", rng.standard_normal(8)) for i in range(count))
+    index.update()
+
+
+def assert_consistent(tmp_path):
+    index = open_index(tmp_path)
+    assert index.is_trained
+    matrix = index.store.matrix()
+    assert len(index.assignments) == index.store.rows
+    assert np.array_equal(index.assignments, IVFIndex._assign(matrix, index.centroids))
+
+
+def test_assignments_from_two_writers_stay_aligned(tmp_path):
+    rng = np.random.default_rng(1)
+    a = open_index(tmp_path)
+    add_random(a, rng, 60, 'seed')  # trains
+    b = open_index(tmp_path)
+    assert b.is_trained
+
+    for round in range(3):
+        add_random(a, rng, 5, f'a{round}-')
+        add_random(b, rng, 7, f'b{round}-')
+
+    assert_consistent(tmp_path)
+
+
+def test_writer_picks_up_another_writers_retraining(tmp_path):
+    rng = np.random.default_rng(2)
+    a = open_index(tmp_path)
+    add_random(a, rng, 60, 'seed')
+    b = open_index(tmp_path)
+    assert b.is_trained
+    add_random(a, rng, 200, 'grow')  # a retrains into a new version
+    assert a.version > b.version
+
+    add_random(b, rng, 3, 'late')
+    assert b.version == a.version
+    assert_consistent(tmp_path)
@@ -0,0 +1,80 @@
+import pytest
+
+import context_manager
+from context_manager import ContextManager, count_tokens
+
+
+@pytest.fixture(autouse=True)
+def char_estimate(monkeypatch):
+    # Deterministic counts whether or not tiktoken is installed: 4 characters per token
+    monkeypatch.setattr(context_manager, '_encoder', False)
+
+
+def words(n, word="word"):
+    return " ".join([word] * n)
+
+
+def assert_totals_consistent(ctx):
+    assert ctx.entry_tokens == sum(t for _, _, t in ctx.entries)
+    assert ctx.summary_total == sum(t for _, t in ctx.summary)
+
+
+def test_old_turns_beyond_max_turns_are_summarized():
+    ctx = ContextManager(max_tokens=4000, max_turns=3)
+    for i in range(5):
+        ctx.add('user', f"Question {i}. With more detail after the first sentence.")
+
+    assert [e['content'][:10] for e in ctx.history()] == ["Question 2", "Question 3", "Question 4"]
+    assert ctx.evicted == 2
+    assert [line for line, _ in ctx.summary] == ["- user: Question 0.", "- user: Question 1."]
+    assert_totals_consistent(ctx)
+
+
+def test_context_stays_within_the_token_budget():
+    ctx = ContextManager(max_tokens=200, max_turns=100, summary_tokens=30)
+    budget = 200 - ContextManager.RESERVED_TOKENS
+    for i in range(20):
+        ctx.add('user' if i % 2 == 0 else 'assistant', words(8, f"turn{i}"))
+        assert ctx.tokens <= budget
+        assert_totals_consistent(ctx)
+
+    assert ctx.evicted > 0
+    assert ctx.history()[-1]['content'] == words(8, "turn19")
+    assert ctx.summary_total <= 30
+    # The summaries kept are the most recent evictions
+    assert "turn" in ctx.summary[-1][0]
+    assert count_tokens(ctx.build()) <= budget + 10  # plus headers
+
+
+def test_a_turn_uses_at_most_half_the_budget():
+    ctx = ContextManager(max_tokens=200)
+    ctx.add('user', words(500))
+    line = ctx.entries[0][1]
+    assert line.endswith("...")
+    assert count_tokens(line) <= 100 + 2
+    assert ctx.history()[0]['content'] == words(500)  # the stored turn is intact
+
+
+def test_summaries_are_shed_when_only_the_newest_turn_fits():
+    ctx = ContextManager(max_tokens=200, summary_tokens=100)
+    for i in range(3):
+        ctx.add('user', words(25, f"earlier{i}"))
+    ctx.add('user', words(500))
+
+    assert len(ctx) == 1
+    assert ctx.evicted == 3
+    assert ctx.tokens <= 200 - ContextManager.RESERVED_TOKENS
+    assert_totals_consistent(ctx)
+
+
+def test_build_renders_summary_turns_and_extra_lines():
+    ctx = ContextManager(max_turns=1)
+    ctx.add('user', "Hello there. How are you?")
+    ctx.add('assistant', "Fine.", agent="Assistant")
+
+    assert ctx.build(["Current time: now"]) == (
+        "Earlier conversation (summary):\n- user: Hello there.\n\n"
+        "Recent conversation:\nassistant: Fine.\n\n"
+        "Current time: now"
+    )
+    assert ctx.history() == [{'role': 'assistant', 'content': "Fine.", 'agent': "Assistant"}]
@@ -0,0 +1,110 @@
+import json
+import os
+
+import pytest
+
+from journal import Journal
+from metadata_store import MetadataStore
+from storage import atomic_write_json
+
+
+def write_lines(path, *lines):
+    with open(path, 'wb') as f:
+        f.write(b''.join(lines))
+
+
+def entry(i):
+    return json.dumps({'i': i}).encode() + b'\n'
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "test.journal")
+
+
+def test_replay_drops_unterminated_last_line(path):
+    write_lines(path, entry(0), entry(1), b'{"i": 2')
+    journal = Journal(path)
+
+    assert journal.replay() == [{'i': 0}, {'i': 1}]
+    assert os.path.getsize(path) == len(entry(0) + entry(1))
+
+
+def test_append_after_torn_tail_starts_on_a_fresh_line(path):
+    write_lines(path, entry(0), b'{"i": 1, "pad')
+    journal = Journal(path)
+    journal.append({'i': 2})
+    journal.close()
+
+    assert Journal(path).replay() == [{'i': 0}, {'i': 2}]
+
+
+def test_replay_stops_at_corrupt_middle_line(path):
+    write_lines(path, entry(0), b'not json\n', entry(2))
+    journal = Journal(path)
+
+    assert journal.replay() == [{'i': 0}]
+    assert os.path.getsize(path) == len(entry(0))
+    assert journal.entries_since_reset == 1
+
+
+def test_replay_missing_file(path):
+    assert Journal(path).replay() == []
+
+
+def test_crash_between_snapshot_and_reset_replays_idempotently(tmp_path):
+    snapshot, journal_file = str(tmp_path / "metadata.json"), str(tmp_path / "metadata.journal")
+    store = MetadataStore(snapshot, journal_file, checkpoint_interval=100)
+    store.create({'id': 'a', 'content': 'x', 'created': '2024-01-01 00:00:00', 'access_count': 0})
+    store.create({'id': 'b', 'content': 'y', 'created': '2024-01-01 00:00:00', 'access_count': 0})
+    store.record_access('a')
+    store.modify('b', {'content': 'z'})
+    expected = json.loads(json.dumps(store.records))
+
+    # The snapshot was renamed into place, but the journal was never reset
+    atomic_write_json(snapshot, store.records)
+    store.journal.close()
+
+    reopened = MetadataStore(snapshot, journal_file)
+    assert reopened.records == expected
+    assert reopened['a']['access_count'] == 1
+
+
+def test_tail_reads_last_entries_across_blocks(path, monkeypatch):
+    monkeypatch.setattr(Journal, 'TAIL_BLOCK', 16)
+    journal = Journal(path)
+    journal.append_many({'i': i} for i in range(50))
+    journal.close()
+
+    assert journal.tail(3) == [{'i': 47}, {'i': 48}, {'i': 49}]
+    assert journal.tail(100) == [{'i': i} for i in range(50)]
+    assert journal.tail(0) == []
+
+
+def test_tail_ignores_torn_last_line(path):
+    write_lines(path, entry(0), entry(1), b'{"i": 2')
+
+    assert Journal(path).tail(2) == [{'i': 0}, {'i': 1}]
+
+
+def test_compact_keeps_last_entries_and_archives(path):
+    journal = Journal(path)
+    journal.append_many({'i': i} for i in range(10))
+    archive = path + ".1"
+    journal.compact(3, archive=archive)
+
+    assert journal.replay() == [{'i': 7}, {'i': 8}, {'i': 9}]
+    assert Journal(archive).replay() == [{'i': i} for i in range(10)]
+
+    journal.append({'i': 10})
+    journal.close()
+    assert Journal(path).tail(2) == [{'i': 9}, {'i': 10}]
+
+
+def test_compact_without_archive(path):
+    journal = Journal(path)
+    journal.append_many({'i': i} for i in range(5))
+    journal.compact(2)
+
+    assert journal.replay() == [{'i': 3}, {'i': 4}]
+    assert not os.path.exists(path + ".1")
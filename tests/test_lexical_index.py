@@ -0,0 +1,80 @@
+import math
+
+import pytest
+
+from lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+
+def bm25(tf, df, n, length, avg_length, k1=1.2, b=0.75):
+    idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+    return idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+
+
+def test_tokenize_lowercases_and_drops_stopwords():
+    assert tokenize("Find the Budget report for Q3") == ['budget', 'report', 'q3']
+
+
+def test_scores_match_bm25():
+    index = LexicalIndex(k1=1.2, b=0.75)
+    index.add('a', "budget budget review")
+    index.add('b', "holiday photos")
+    index.add('c', "budget meeting notes today")
+
+    results = dict(index.search("budget"))
+    avg = (3 + 2 + 4) / 3
+    assert results['a'] == pytest.approx(bm25(2, 2, 3, 3, avg))
+    assert results['c'] == pytest.approx(bm25(1, 2, 3, 4, avg))
+    assert 'b' not in results
+
+
+def test_rare_terms_and_short_documents_rank_higher():
+    index = LexicalIndex()
+    index.add('common', "report report quarterly")
+    index.add('rare', "report invoice")
+    index.add('other', "report summary")
+    assert index.search("report invoice")[0][0] == 'rare'
+
+    index = LexicalIndex()
+    index.add('short', "budget plan")
+    index.add('long', "budget plan with many other words about various things")
+    assert [doc for doc, _ in index.search("budget")] == ['short', 'long']
+
+
+def test_tags_count_extra():
+    index = LexicalIndex(tag_weight=3)
+    index.add('tagged', "quarterly numbers", tags=['finance'])
+    index.add('plain', "finance quarterly numbers")
+    assert index.postings['finance'] == {'tagged': 3, 'plain': 1}
+    assert index.search("finance")[0][0] == 'tagged'
+
+
+def test_reindexing_replaces_a_document():
+    index = LexicalIndex()
+    index.add('a', "budget review")
+    index.add('b', "holiday photos")
+    index.add('a', "travel plans")
+    assert index.search("budget") == []
+    assert index.search("travel")[0][0] == 'a'
+    assert index.total_length == 4
+    assert len(index) == 2
+    assert 'budget' not in index.postings
+
+
+def test_search_limit_and_empty_queries():
+    index = LexicalIndex()
+    for i in range(5):
+        index.add(str(i), "report " * (i + 1))
+    assert len(index.search("report", limit=2)) == 2
+    assert index.search("the and of") == []
+    assert LexicalIndex().search("report") == []
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([['a', 'b', 'c'], ['b', 'c', 'd']], k=60)
+    scores = dict(fused)
+    assert [doc for doc, _ in fused][:2] == ['b', 'c']
+    assert scores['b'] == pytest.approx(1 / 62 + 1 / 61)
+    assert scores['a'] == pytest.approx(1 / 61)
+    assert scores['d'] == pytest.approx(1 / 63)
+    # Documents found by both rankings beat a top hit found by one
+    assert scores['c'] > scores['a']
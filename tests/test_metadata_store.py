@@ -0,0 +1,61 @@
+import os
+
+from metadata_store import MetadataStore
+
+
+def open_store(tmp_path, interval=3):
+    return MetadataStore(os.path.join(tmp_path, "metadata.json"),
+                         os.path.join(tmp_path, "metadata.journal"), interval)
+
+
+def record(file_id):
+    return {'id': file_id, 'created': '2024-01-01 00:00:00', 'access_count': 0}
+
+
+def test_checkpoint_keeps_other_writers_entries(tmp_path):
+    a, b = open_store(tmp_path), open_store(tmp_path)
+    a.create(record('a1'))
+    b.create(record('b1'))
+    a.create(record('a2'))
+    a.create(record('a3'))  # checkpoints
+    b.create(record('b2'))
+    a.close()
+    b.close()
+
+    assert sorted(open_store(tmp_path)) == ['a1', 'a2', 'a3', 'b1', 'b2']
+
+
+def test_checkpoint_after_another_writers_checkpoint(tmp_path):
+    a, b = open_store(tmp_path), open_store(tmp_path)
+    b.create(record('b1'))
+    for i in range(3):
+        a.create(record(f'a{i}'))  # checkpoints
+    for i in range(3):
+        b.modify('b1', {'tags': [str(i)]})  # b checkpoints over a's snapshot
+    a.close()
+    b.close()
+
+    store = open_store(tmp_path)
+    assert sorted(store) == ['a0', 'a1', 'a2', 'b1']
+    assert store['b1']['tags'] == ['2']
+
+
+def test_refresh_sees_other_writers(tmp_path):
+    a, b = open_store(tmp_path, interval=100), open_store(tmp_path, interval=100)
+    a.create(record('a1'))
+    b.create(record('b1'))
+    a.refresh()
+    assert sorted(a) == ['a1', 'b1']
+
+
+def test_access_counts_from_two_writers_add_up(tmp_path):
+    a, b = open_store(tmp_path, interval=4), open_store(tmp_path, interval=4)
+    a.create(record('f'))
+    b.records  # loaded before a's accesses, so b's view goes stale
+    for _ in range(3):
+        a.record_access('f')
+        b.record_access('f')
+    a.close()
+    b.close()
+
+    assert open_store(tmp_path)['f']['access_count'] == 6
@@ -0,0 +1,137 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import rate_limiter
+from rate_limiter import BULK, INTERACTIVE, RateLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+    # Jitter always at its upper bound
+    monkeypatch.setattr(rate_limiter, 'random', SimpleNamespace(uniform=lambda low, high: high))
+    return clock
+
+
+def flaky(*errors):
+    """An API call that raises `errors` in turn, then succeeds."""
+    remaining = list(errors)
+
+    def fn():
+        if remaining:
+            raise remaining.pop(0)
+        return "ok"
+    return fn
+
+
+def test_token_bucket_refills_continuously():
+    bucket = TokenBucket(60)  # one unit per second
+    bucket.updated = 0.0
+    bucket.take(60)
+    assert bucket.wait_time(1, 0.0) == 1.0
+    assert bucket.wait_time(1, 0.5) == pytest.approx(0.5)
+    assert bucket.wait_time(1, 1.0) == 0.0
+    # Requests larger than the bucket only wait for a full bucket
+    assert bucket.wait_time(600, 1.0) == pytest.approx(59.0)
+    # A slowed-down limiter refills proportionally slower
+    assert bucket.wait_time(2, 1.0, scale=0.5) == pytest.approx(2.0)
+
+
+def test_interactive_calls_go_ahead_of_bulk(clock):
+    limiter = RateLimiter({'default': (60, 1000000)})
+    with limiter._cond:
+        lane, bulk = limiter._enqueue('model', BULK)
+        _, first = limiter._enqueue('model', INTERACTIVE)
+        _, second = limiter._enqueue('model', None)
+
+        assert limiter._try_acquire(lane, bulk, 10) is None
+        assert limiter._try_acquire(lane, second, 10) is None  # same priority: first come, first served
+        assert limiter._try_acquire(lane, first, 10) == 0.0
+        assert limiter._try_acquire(lane, second, 10) == 0.0
+        assert limiter._try_acquire(lane, bulk, 10) == 0.0
+
+
+def test_waits_for_the_token_budget(clock):
+    limiter = RateLimiter({'default': (1000, 600)})  # 10 tokens per second
+    with limiter._cond:
+        lane, ticket = limiter._enqueue('model', None)
+        assert limiter._try_acquire(lane, ticket, 600) == 0.0
+        lane, ticket = limiter._enqueue('model', None)
+        assert limiter._try_acquire(lane, ticket, 50) == pytest.approx(5.0)
+        clock.now += 5
+        assert limiter._try_acquire(lane, ticket, 50) == 0.0
+
+
+@pytest.mark.parametrize('headers, expected', [
+    ({'retry-after': '2'}, 2.0),
+    ({'retry-after-ms': '1500'}, 1.5),
+])
+def test_rate_limit_honours_retry_after(clock, headers, expected):
+    limiter = RateLimiter({'default': (1000, 1000000)})
+    assert limiter.call('model', 10, flaky(FakeAPIError(429, headers))) == "ok"
+
+    jitter = 0.1 * expected + 0.05
+    assert clock.sleeps == [pytest.approx(expected + jitter)]
+    # A 429 pauses every caller and slows the buckets down
+    assert limiter._paused_until == pytest.approx(1000.0 + expected + jitter)
+    assert limiter.stats['rate_limited'] == 1
+    assert limiter.scale == pytest.approx(0.7 + 0.02)
+
+
+def test_server_errors_back_off_exponentially_then_give_up(clock):
+    limiter = RateLimiter({'default': (1000, 1000000)}, max_retries=3, base_delay=0.5, max_delay=1.5)
+    error = FakeAPIError(503)
+    with pytest.raises(FakeAPIError):
+        limiter.call('model', 10, flaky(error, error, error, error))
+
+    assert clock.sleeps == [0.5, 1.0, 1.5]
+    assert limiter.stats['retries'] == 3
+    assert limiter.stats['failures'] == 1
+
+
+def test_client_errors_are_not_retried(clock):
+    limiter = RateLimiter({'default': (1000, 1000000)})
+    with pytest.raises(FakeAPIError):
+        limiter.call('model', 10, flaky(FakeAPIError(400)))
+    assert clock.sleeps == []
+    assert limiter.stats['failures'] == 1
+
+
+def test_async_call_retries(clock, monkeypatch):
+    async def fake_sleep(seconds):
+        clock.sleep(seconds)
+    monkeypatch.setattr(rate_limiter.asyncio, 'sleep', fake_sleep)
+    limiter = RateLimiter({'default': (1000, 1000000)}, base_delay=0.5)
+    fn = flaky(FakeAPIError(500))
+
+    async def call():
+        return fn()
+
+    assert asyncio.run(limiter.call_async('model', 10, call)) == "ok"
+    assert clock.sleeps == [0.5]
@@ -0,0 +1,26 @@
+import time
+
+from resource_manager import PredictiveResourceManager, SampleRing
+
+
+def test_sample_ring_keeps_the_newest_samples_in_order():
+    ring = SampleRing(['cpu'], 4)
+    for i in range(6):
+        ring.append(float(i), {'cpu': i * 10.0})
+
+    snap = ring.snapshot()
+    # The oldest slot is dropped: a writer could be overwriting it mid-copy
+    assert list(snap['time']) == [3.0, 4.0, 5.0]
+    assert list(snap['cpu']) == [30.0, 40.0, 50.0]
+    assert list(ring.snapshot(last=2)['cpu']) == [40.0, 50.0]
+
+
+def test_usage_history_reads_recent_windows_from_the_ring():
+    rm = PredictiveResourceManager()
+    now = time.time()
+    for i, cpu in enumerate([10.0, 20.0, 60.0, 30.0]):
+        rm.history.append(now - 30 + i * 10, {'cpu': cpu, 'memory': 50.0, 'disk_io': 1.0})
+
+    summary = rm.usage_history(15)
+    assert summary['cpu'] == {'mean': 45.0, 'max': 60.0}
+    assert summary['memory']['mean'] == 50.0
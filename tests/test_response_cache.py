@@ -0,0 +1,96 @@
+import os
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(response_cache, 'time', SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return os.path.join(tmp_path, "responses.db")
+
+
+def messages(i):
+    return [{"role": "user", "content": f"classify command {i}"}]
+
+
+def disk_keys(path):
+    with sqlite3.connect(path) as db:
+        return {key for key, in db.execute("SELECT key FROM responses")}
+
+
+def test_hit_until_the_ttl_expires(clock):
+    cache = ResponseCache(path=None, ttl=60)
+    cache.put('model', 0.0, messages(1), "FILE")
+    clock.now += 60
+    assert cache.get('model', 0.0, messages(1)) == "FILE"
+    clock.now += 1
+    assert cache.get('model', 0.0, messages(1)) is None
+    assert cache.stats['expired'] == 1
+    assert cache.get_stats()['size'] == 0
+
+
+def test_key_covers_model_temperature_and_messages(clock):
+    cache = ResponseCache(path=None)
+    cache.put('model', 0.0, messages(1), "FILE")
+    assert cache.get('other', 0.0, messages(1)) is None
+    assert cache.get('model', 0.3, messages(1)) is None
+    assert cache.get('model', 0.0, messages(2)) is None
+
+
+def test_memory_tier_evicts_least_recently_used(clock):
+    cache = ResponseCache(path=None, max_entries=2)
+    cache.put('model', 0.0, messages(1), "one")
+    cache.put('model', 0.0, messages(2), "two")
+    cache.get('model', 0.0, messages(1))
+    cache.put('model', 0.0, messages(3), "three")
+    assert cache.get('model', 0.0, messages(2)) is None
+    assert cache.get('model', 0.0, messages(1)) == "one"
+    assert cache.stats['evictions'] == 1
+
+
+def test_disk_tier_survives_a_restart_and_expires(clock, path):
+    cache = ResponseCache(path=path, ttl=60)
+    cache.put('model', 0.0, messages(1), "FILE")
+    cache.close()
+
+    reopened = ResponseCache(path=path, ttl=60)
+    assert reopened.get('model', 0.0, messages(1)) == "FILE"
+    assert reopened.stats['disk_hits'] == 1
+
+    restarted = ResponseCache(path=path, ttl=60)
+    clock.now += 61
+    assert restarted.get('model', 0.0, messages(1)) is None
+    assert disk_keys(path) == set()
+    for cache in (reopened, restarted):
+        cache.close()
+
+
+def test_put_prunes_expired_rows(clock, path):
+    cache = ResponseCache(path=path, ttl=60)
+    cache.put('model', 0.0, messages(1), "old")
+    clock.now += 61
+    cache.put('model', 0.0, messages(2), "new")
+    assert disk_keys(path) == {ResponseCache.key('model', 0.0, messages(2))}
+    assert cache.stats['disk_evictions'] == 1
+    cache.close()
+
+
+def test_put_caps_the_disk_tier(clock, path):
+    cache = ResponseCache(path=path, max_disk_entries=3)
+    for i in range(5):
+        clock.now += 1
+        cache.put('model', 0.0, messages(i), str(i))
+    assert disk_keys(path) == {ResponseCache.key('model', 0.0, messages(i)) for i in (2, 3, 4)}
+    assert cache.stats['disk_evictions'] == 2
+    cache.close()
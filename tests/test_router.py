@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+import utils
+from router import CommandRouter
+
+EXAMPLES = {'FILE': ["open my notes"], 'SYSTEM': ["check cpu usage"], 'GENERAL': ["tell me a joke"]}
+VECTORS = {"open my notes": [1.0, 0.0, 0.0], "check cpu usage": [0.0, 1.0, 0.0], "tell me a joke": [0.0, 0.0, 1.0]}
+
+
+def fake_embedding(text, use_cache=True):
+    return VECTORS.get(text, [0.9, 0.1, 0.0])
+
+
+def failing_embedding(text, use_cache=True):
+    raise RuntimeError("embeddings API unavailable")
+
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr(utils, 'get_embeddings', lambda texts, use_cache=True: [fake_embedding(t) for t in texts])
+    monkeypatch.setattr(utils, 'get_embedding', fake_embedding)
+    return CommandRouter(EXAMPLES)
+
+
+def test_route_locally(router):
+    assert router.route("open the notes file", lambda: pytest.fail("LLM called")) == 'FILE'
+    assert router.stats['fallbacks'] == 0
+
+
+def test_route_falls_back_to_the_llm_when_embedding_fails(router, monkeypatch):
+    monkeypatch.setattr(utils, 'get_embedding', failing_embedding)
+    assert router.route("how busy is the machine", lambda: "SYSTEM") == 'SYSTEM'
+    assert router.stats['fallbacks'] == 1
+
+
+def test_route_falls_back_when_the_examples_cannot_be_embedded(monkeypatch):
+    monkeypatch.setattr(utils, 'get_embeddings', lambda texts, use_cache=True: failing_embedding(texts))
+    assert CommandRouter(EXAMPLES).route("open my notes", lambda: "FILE") == 'FILE'
+
+
+def test_route_async_falls_back_when_the_speculative_embedding_fails(router):
+    async def failing_task():
+        raise RuntimeError("embeddings API unavailable")
+
+    async def fallback():
+        return "GENERAL"
+
+    async def run():
+        return await router.route_async("tell me something", fallback, asyncio.ensure_future(failing_task()))
+
+    assert asyncio.run(run()) == 'GENERAL'
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import pytest
+
+import config
+import semantic_storage
+import utils
+from semantic_storage import SemanticFileSystem
+
+
+@pytest.fixture
+def fs(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'STORAGE_PATH', str(tmp_path))
+    monkeypatch.setattr(config, 'LEXICAL_SHORTCUT', False)
+    monkeypatch.setattr(utils, 'get_embedding', lambda text, use_cache=True: [1.0, 0.0, 0.0])
+    fs = SemanticFileSystem()
+    fs.create_file("quarterly budget review notes", "finance")
+    fs.create_file("holiday photos from the coast", "travel")
+    yield fs
+    fs.close()
+
+
+def failing_embedding(text, use_cache=True):
+    raise RuntimeError("embeddings API unavailable")
+
+
+def test_hybrid_search_falls_back_to_keyword_hits(fs, monkeypatch):
+    monkeypatch.setattr(utils, 'get_embedding', failing_embedding)
+    results = fs.search("budget", mode='hybrid')
+    assert [r['content'] for r in results] == ["quarterly budget review notes"]
+
+
+def test_hybrid_search_raises_without_keyword_hits(fs, monkeypatch):
+    monkeypatch.setattr(utils, 'get_embedding', failing_embedding)
+    with pytest.raises(RuntimeError):
+        fs.search("nothing matches this", mode='hybrid')
+
+
+def test_semantic_search_raises(fs, monkeypatch):
+    monkeypatch.setattr(utils, 'get_embedding', failing_embedding)
+    with pytest.raises(RuntimeError):
+        fs.search("budget", mode='semantic')
+
+
+def test_two_processes_creating_in_the_same_second_get_distinct_ids(fs, monkeypatch):
+    class FrozenClock:
+        @staticmethod
+        def now():
+            return datetime(2026, 1, 1, 12, 0, 0)
+
+    monkeypatch.setattr(semantic_storage, 'datetime', FrozenClock)
+    other = SemanticFileSystem()
+    len(other.metadata)  # preloaded, like a long-running process
+    first = fs.create_file("meeting agenda for monday")
+    second = other.create_file("grocery list for the week")
+    other.close()
+    fs.close()
+
+    assert first != second
+    reopened = SemanticFileSystem()
+    assert len(reopened.metadata) == 4
+    assert len(reopened.vectors) == 4
+    reopened.close()
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pytest
+
+from vector_store import VectorStore
+
+
+def unit(i, dim=4):
+    v = np.zeros(dim, dtype=np.float32)
+    v[i] = 1.0
+    return v
+
+
+@pytest.mark.parametrize('dtype', ['float32', 'int8'])
+def test_appends_from_two_stores_keep_rows_aligned(tmp_path, dtype):
+    path = os.path.join(tmp_path, "vectors")
+    a, b = VectorStore(path, dtype), VectorStore(path, dtype)
+    a.add('x', unit(0))
+    b.add('y', unit(1))
+    a.add('z', unit(2))
+
+    assert np.allclose(a.get('z'), unit(2))
+    assert np.allclose(a.get('y'), unit(1))
+    assert a.search(unit(2), 1) == [('z', pytest.approx(1.0, abs=1e-2))]
+
+    reopened = VectorStore(path, dtype)
+    assert reopened.rows == 3
+    assert reopened.row_ids == ['x', 'y', 'z']
+    assert np.allclose(reopened.get('x'), unit(0))
+
+
+def test_torn_id_is_dropped_on_load(tmp_path):
+    path = os.path.join(tmp_path, "vectors")
+    store = VectorStore(path, 'float32')
+    store.add_many([('x', unit(0)), ('y', unit(1))])
+    with open(f"{path}.f32", 'ab') as f:
+        f.write(unit(2).tobytes())
+    with open(f"{path}.ids", 'ab') as f:
+        f.write(b'z')  # crashed before the newline
+
+    reopened = VectorStore(path, 'float32')
+    assert reopened.rows == 2
+    reopened.add('w', unit(3))
+    again = VectorStore(path, 'float32')
+    assert again.rows == 3
+    assert again.row_ids == ['x', 'y', 'w']
+    assert np.allclose(again.get('w'), unit(3))
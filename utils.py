@@ -1,38 +1,139 @@
-import openai
-import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import json
 import os
+import threading
 from datetime import datetime
 import config
+from embedding_cache import EmbeddingCache
+from response_cache import ResponseCache
+from context_manager import UsageTracker, count_tokens
+from rate_limiter import RateLimiter
 
-# Initialize OpenAI client
-client = openai.OpenAI(api_key=config.OPENAI_API_KEY)
+# Shared OpenAI clients, created on first use. Each client keeps its own
+# HTTP connection pool, so all agents share one instead of building their own.
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
 
-def get_embedding(text: str) -> List[float]:
-    """Get embedding for a text string."""
-    try:
-        response = client.embeddings.create(
-            model=config.EMBEDDING_MODEL,
-            input=text
+def get_client():
+    """Get the shared OpenAI client."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import openai
+                # Retries are left to the shared rate limiter
+                _client = openai.OpenAI(api_key=config.OPENAI_API_KEY, base_url=config.OPENAI_BASE_URL,
+                                        max_retries=0)
+    return _client
+
+def get_async_client():
+    """Get the shared async OpenAI client."""
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                import openai
+                _async_client = openai.AsyncOpenAI(api_key=config.OPENAI_API_KEY, base_url=config.OPENAI_BASE_URL,
+                                                   max_retries=0)
+    return _async_client
+
+# Shared embedding cache (memory LRU + on-disk tier)
+embedding_cache = EmbeddingCache()
+
+# Shared cache for opt-in chat completion responses
+response_cache = ResponseCache()
+
+# Token usage and cost of all API requests
+usage_tracker = UsageTracker()
+
+# Scheduler every API request goes through (rate limits, priorities, retries)
+rate_limiter = RateLimiter()
+
+def record_usage(model: str, response):
+    """Add the token usage reported with an API response to the tracker."""
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        usage_tracker.record(model, usage.prompt_tokens, getattr(usage, 'completion_tokens', 0) or 0)
+
+def get_embedding(text: str, use_cache: bool = True) -> List[float]:
+    """Get embedding for a text string.
+    
+    API errors are raised once the rate limiter's retries are exhausted.
+    """
+    if use_cache:
+        cached = embedding_cache.get(text)
+        if cached is not None:
+            return cached
+    
+    response = rate_limiter.call(
+        config.EMBEDDING_MODEL, count_tokens(text),
+        lambda: get_client().embeddings.create(model=config.EMBEDDING_MODEL, input=text)
+    )
+    record_usage(config.EMBEDDING_MODEL, response)
+    embedding = response.data[0].embedding
+    
+    if use_cache:
+        embedding_cache.put(text, embedding)
+    return embedding
+
+async def get_embedding_async(text: str, use_cache: bool = True) -> List[float]:
+    """Get embedding for a text string without blocking the event loop."""
+    if use_cache:
+        cached = embedding_cache.get(text)
+        if cached is not None:
+            return cached
+    
+    response = await rate_limiter.call_async(
+        config.EMBEDDING_MODEL, count_tokens(text),
+        lambda: get_async_client().embeddings.create(model=config.EMBEDDING_MODEL, input=text)
+    )
+    record_usage(config.EMBEDDING_MODEL, response)
+    embedding = response.data[0].embedding
+    
+    if use_cache:
+        embedding_cache.put(text, embedding)
+    return embedding
+
+def get_embeddings(texts: List[str], use_cache: bool = True,
+                   priority: Optional[int] = None) -> List[List[float]]:
+    """Get embeddings for several texts with one batched API request.
+    
+    `priority` is the rate limiter priority (BULK for ingestion);
+    INTERACTIVE by default.
+    """
+    embeddings = [None] * len(texts)
+    missing = []
+    for i, text in enumerate(texts):
+        cached = embedding_cache.get(text) if use_cache else None
+        if cached is not None:
+            embeddings[i] = cached
+        else:
+            missing.append(i)
+    
+    if missing:
+        inputs = [texts[i] for i in missing]
+        response = rate_limiter.call(
+            config.EMBEDDING_MODEL, sum(count_tokens(t) for t in inputs),
+            lambda: get_client().embeddings.create(model=config.EMBEDDING_MODEL, input=inputs),
+            priority
         )
-        return response.data[0].embedding
-    except Exception as e:
-        print(f"Error getting embedding: {e}")
-        return []
+        record_usage(config.EMBEDDING_MODEL, response)
+        for item in response.data:
+            i = missing[item.index]
+            embeddings[i] = item.embedding
+            if use_cache:
+                embedding_cache.put(texts[i], item.embedding)
+    
+    return embeddings
 
 def cosine_similarity(a: List[float], b: List[float]) -> float:
     """Calculate cosine similarity between two vectors."""
+    import numpy as np
     a_np = np.array(a)
     b_np = np.array(b)
     return np.dot(a_np, b_np) / (np.linalg.norm(a_np) * np.linalg.norm(b_np))
 
-def save_json(data: Dict[str, Any], filepath: str):
-    """Save data to JSON file."""
-    os.makedirs(os.path.dirname(filepath) if os.path.dirname(filepath) else '.', exist_ok=True)
-    with open(filepath, 'w') as f:
-        json.dump(data, f, indent=2, default=str)
-
 def load_json(filepath: str) -> Dict[str, Any]:
     """Load data from JSON file."""
     if os.path.exists(filepath):
@@ -0,0 +1,350 @@
+import os
+import json
+import numpy as np
+from typing import List, Dict, Tuple, Optional, Iterable
+import config
+from storage import FileLock, atomic_write, atomic_write_json
+
+# Quantized representations: file suffix and element type
+QUANTIZED = {'float16': ('f16', np.float16), 'int8': ('i8', np.int8)}
+SCAN_BLOCK = 1 << 18  # elements converted to float32 at a time while scoring (stays in cache)
+
+class VectorStore:
+    """Append-only, memory-mapped store of normalized embeddings.
+
+    Vectors live in a raw float32 file (one row per insert) next to a small
+    text index with one file id per line. Nothing is read until first use,
+    and inserts append a single row instead of rewriting the store.
+
+    With `dtype` 'float16' or 'int8' a quantized copy of every row is kept
+    in a parallel file (int8 rows are scaled per vector, with the scales in
+    a third file) and searches score that copy, touching a half or a
+    quarter of the bytes. With `rerank` the best `rerank_factor * limit`
+    candidates are then rescored exactly from the float32 rows.
+
+    Appends take an advisory lock on `<path>.lock` and first pick up ids
+    other processes appended, so processes sharing a store agree on which
+    row holds which vector.
+    """
+
+    DTYPE = np.float32
+
+    def __init__(self, path: str, dtype: str = config.VECTOR_DTYPE,
+                 rerank: bool = config.VECTOR_RERANK,
+                 rerank_factor: int = config.VECTOR_RERANK_FACTOR):
+        if dtype != 'float32' and dtype not in QUANTIZED:
+            raise ValueError(f"unsupported vector dtype {dtype!r}")
+        self.path = path
+        self.dtype = dtype
+        self.rerank = rerank and dtype != 'float32'
+        self.rerank_factor = rerank_factor
+        self.data_file = f"{path}.f32"
+        self.ids_file = f"{path}.ids"
+        self.meta_file = f"{path}.json"
+        suffix, self.code_type = QUANTIZED.get(dtype, (None, None))
+        self.codes_file = f"{path}.{suffix}" if suffix else None
+        self.scales_file = f"{path}.scales"
+        self.lock = FileLock(f"{path}.lock")
+        self.dim: Optional[int] = None
+        self.row_ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self._dead = set()
+        self._ids_offset = 0  # bytes of the id index read so far
+        self._mm = None
+        self._codes_mm = None
+        self._scales = None
+        self._loaded = False
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self.positions)
+
+    def __contains__(self, file_id: str) -> bool:
+        self._ensure_loaded()
+        return file_id in self.positions
+
+    @property
+    def rows(self) -> int:
+        """Number of physical rows, including superseded ones."""
+        self._ensure_loaded()
+        return len(self.row_ids)
+
+    @property
+    def scan_bytes(self) -> int:
+        """Bytes of vector data a full search reads (the working set)."""
+        self._ensure_loaded()
+        if not self.dim:
+            return 0
+        itemsize = np.dtype(self.code_type or self.DTYPE).itemsize
+        scales = 4 if self.dtype == 'int8' else 0
+        return len(self.row_ids) * (self.dim * itemsize + scales)
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        """Convert a vector to a unit-length float32 array."""
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        if norm > 0:
+            v = v / norm
+        return v
+
+    def _ensure_loaded(self):
+        """Read the id index and header on first use."""
+        if self._loaded:
+            return
+        self._loaded = True
+        with self.lock:
+            self._refresh()
+
+    def _refresh(self):
+        """Read ids appended since the last read, by this or another process.
+
+        Also reconciles the files after an interrupted append. Call with
+        the lock held.
+        """
+        if self.dim is None and os.path.exists(self.meta_file):
+            with open(self.meta_file, 'r') as f:
+                self.dim = json.load(f).get('dim')
+
+        data = b''
+        if os.path.exists(self.ids_file):
+            with open(self.ids_file, 'rb') as f:
+                f.seek(self._ids_offset)
+                data = f.read()
+        # Anything after the last newline is a torn, unterminated id
+        complete = data.rfind(b'\n') + 1
+        ids = self.row_ids + data[:complete].decode('utf-8').split('\n')[:-1]
+        self._ids_offset += complete
+
+        # Reconcile the two files after an interrupted append
+        rows = 0
+        if self.dim and os.path.exists(self.data_file):
+            rows = os.path.getsize(self.data_file) // (self.dim * self.DTYPE().itemsize)
+        count = min(len(ids), rows)
+        if count < len(ids) or count < rows or complete < len(data):
+            self._truncate(count, ids[:count])
+            self._ids_offset = os.path.getsize(self.ids_file)
+
+        for file_id in ids[len(self.row_ids):count]:
+            self._index(file_id)
+        self._sync_codes()
+
+    def _index(self, file_id: str):
+        """Point `file_id` at the next row, superseding its previous one."""
+        if file_id in self.positions:
+            self._dead.add(self.positions[file_id])
+        self.positions[file_id] = len(self.row_ids)
+        self.row_ids.append(file_id)
+
+    def _code_rows(self) -> int:
+        """Rows in the quantized files."""
+        rows = 0
+        if os.path.exists(self.codes_file):
+            rows = os.path.getsize(self.codes_file) // (self.dim * np.dtype(self.code_type).itemsize)
+        if self.dtype == 'int8':
+            scales = os.path.getsize(self.scales_file) // 4 if os.path.exists(self.scales_file) else 0
+            rows = min(rows, scales)
+        return rows
+
+    def _sync_codes(self):
+        """Bring the quantized copy in line with the float32 rows.
+
+        Covers stores written before quantization (or with another dtype)
+        and appends torn between the two files.
+        """
+        if self.codes_file is None or not self.dim:
+            return
+        n = len(self.row_ids)
+        done = self._code_rows()
+        if done != n:
+            # Cut the quantized files to a common row count before appending
+            done = min(done, n)
+            widths = [(self.codes_file, self.dim * np.dtype(self.code_type).itemsize)]
+            if self.dtype == 'int8':
+                widths.append((self.scales_file, 4))
+            for filename, width in widths:
+                if os.path.exists(filename):
+                    with open(filename, 'r+b') as f:
+                        f.truncate(done * width)
+        if done == n:
+            return
+        matrix = self._matrix()
+        for start in range(done, n, 65536):
+            self._append_codes(np.asarray(matrix[start:start + 65536]))
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Quantized rows and, for int8, the per-row scales."""
+        if self.dtype == 'float16':
+            return vectors.astype(np.float16), None
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _append_codes(self, vectors: np.ndarray):
+        codes, scales = self._quantize(vectors)
+        self._codes_mm = None
+        with open(self.codes_file, 'ab') as f:
+            f.write(codes.tobytes())
+        if scales is not None:
+            with open(self.scales_file, 'ab') as f:
+                f.write(scales.tobytes())
+            if self._scales is not None:
+                self._scales = np.concatenate([self._scales, scales])
+
+    def _truncate(self, count: int, ids: List[str]):
+        """Drop rows and ids beyond `count`."""
+        if self.dim and os.path.exists(self.data_file):
+            with open(self.data_file, 'r+b') as f:
+                f.truncate(count * self.dim * self.DTYPE().itemsize)
+        atomic_write(self.ids_file, ''.join(f"{i}\n" for i in ids))
+
+    def _matrix(self) -> Optional[np.ndarray]:
+        """Memory-map the vector file, remapping after appends."""
+        n = len(self.row_ids)
+        if n == 0:
+            return None
+        if self._mm is None or self._mm.shape[0] != n:
+            self._mm = np.memmap(self.data_file, dtype=self.DTYPE, mode='r', shape=(n, self.dim))
+        return self._mm
+
+    def _codes(self) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Memory-mapped quantized rows and the int8 scales (held in memory)."""
+        n = len(self.row_ids)
+        if self._codes_mm is None or self._codes_mm.shape[0] != n:
+            self._codes_mm = np.memmap(self.codes_file, dtype=self.code_type, mode='r', shape=(n, self.dim))
+        if self.dtype == 'int8' and (self._scales is None or len(self._scales) < n):
+            self._scales = np.fromfile(self.scales_file, dtype=np.float32, count=n)
+        return self._codes_mm, self._scales
+
+    def _scores(self, q: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Dot products of `q` with all rows (or `rows`), from the quantized copy if any."""
+        if self.codes_file is None:
+            matrix = self._matrix()
+            return matrix @ q if rows is None else matrix[rows] @ q
+
+        codes, scales = self._codes()
+        n = codes.shape[0] if rows is None else len(rows)
+        step = max(1, SCAN_BLOCK // self.dim)
+        scores = np.empty(n, dtype=np.float32)
+        for start in range(0, n, step):
+            part = slice(start, min(n, start + step)) if rows is None else rows[start:start + step]
+            block = codes[part].astype(np.float32) @ q
+            if scales is not None:
+                block *= scales[part]
+            scores[start:start + len(block)] = block
+        return scores
+
+    def add(self, file_id: str, embedding: List[float]) -> bool:
+        """Add or replace the vector for a file. Returns False if it was skipped."""
+        return self.add_many([(file_id, embedding)]) == 1
+
+    def add_many(self, items: Iterable[Tuple[str, List[float]]]) -> int:
+        """Append vectors in one write. Returns the number of rows added."""
+        self._ensure_loaded()
+        items = list(items)
+
+        with self.lock:
+            # Rows appended by other processes come before ours
+            self._refresh()
+
+            ids, vectors = [], []
+            for file_id, embedding in items:
+                if embedding is None or len(embedding) == 0:
+                    continue
+                if self.dim is None:
+                    self.dim = len(embedding)
+                    os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                    atomic_write_json(self.meta_file, {'dim': self.dim, 'dtype': 'float32'})
+                elif len(embedding) != self.dim:
+                    continue
+                ids.append(file_id)
+                vectors.append(self._normalize(embedding))
+
+            if not ids:
+                return 0
+
+            # Release the mapping before the file grows
+            self._mm = None
+
+            # Rows first, then ids, so a torn append never indexes a missing row
+            matrix = np.vstack(vectors).astype(self.DTYPE)
+            with open(self.data_file, 'ab') as f:
+                f.write(matrix.tobytes())
+            if self.codes_file is not None:
+                self._append_codes(matrix)
+            lines = ''.join(f"{i}\n" for i in ids).encode('utf-8')
+            with open(self.ids_file, 'ab') as f:
+                f.write(lines)
+            self._ids_offset += len(lines)
+
+            for file_id in ids:
+                self._index(file_id)
+
+        return len(ids)
+
+    def get(self, file_id: str) -> Optional[np.ndarray]:
+        """Get the normalized vector for a file."""
+        self._ensure_loaded()
+        if file_id not in self.positions:
+            return None
+        return np.array(self._matrix()[self.positions[file_id]])
+
+    def matrix(self) -> Optional[np.ndarray]:
+        """The (rows x dim) float32 matrix of normalized vectors, including superseded rows."""
+        self._ensure_loaded()
+        return self._matrix()
+
+    def search(self, query: List[float], limit: int = 5,
+               rows: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """Return the top `limit` (file_id, cosine similarity) pairs.
+
+        `rows` optionally restricts scoring to a subset of row numbers.
+        Without re-ranking, similarities from a quantized store are
+        approximate.
+        """
+        self._ensure_loaded()
+        matrix = self._matrix()
+        if matrix is None or limit <= 0 or query is None or len(query) != self.dim:
+            return []
+
+        q = self._normalize(query)
+        if rows is None:
+            scores = self._scores(q, None)
+            rows = np.arange(matrix.shape[0])
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            scores = self._scores(q, rows)
+        if self._dead:
+            scores[np.isin(rows, list(self._dead))] = -np.inf
+
+        # Partial selection of the top-k, then sort only those
+        # (over-select by the superseded rows, which score -inf)
+        n = len(scores)
+        wanted = limit * self.rerank_factor if self.rerank else limit
+        k = min(wanted + len(self._dead), n)
+        if k < n:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(n)
+        top = top[np.argsort(-scores[top], kind='stable')]
+        top = top[scores[top] > -np.inf][:wanted]
+        candidates, best = rows[top], scores[top]
+
+        if self.rerank and len(candidates):
+            # Exact scores from the float32 rows, read in file order
+            order = np.argsort(candidates)
+            exact = np.empty(len(candidates), dtype=np.float32)
+            exact[order] = matrix[candidates[order]] @ q
+            ranked = np.argsort(-exact, kind='stable')
+            candidates, best = candidates[ranked], exact[ranked]
+
+        return [(self.row_ids[row], float(score)) for row, score in zip(candidates[:limit], best[:limit])]
+
+    def import_json(self, embeddings_file: str) -> int:
+        """One-shot migration from the legacy embeddings.json store."""
+        with open(embeddings_file, 'r') as f:
+            embeddings = json.load(f)
+        added = self.add_many(embeddings.items())
+        os.replace(embeddings_file, f"{embeddings_file}.migrated")
+        return added